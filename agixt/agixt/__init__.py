@@ -5,9 +5,17 @@ from typing import *  # type: ignore
 
 import rio
 
+from . import assets
+from . import diagnostics
+from . import log
+from . import page_state
 from . import pages
 from . import components as comps
 
+# Write logs as JSON lines from a background thread, so logging never blocks
+# the event loop.
+log.setup()
+
 # Define a theme for Rio to use.
 #
 # You can modify the colors here to adapt the appearance of your app or website.
@@ -43,7 +51,32 @@ app = rio.App(
             page_url='agent_management',
             build=pages.AgentManagement,
         ),
-    ],
+
+        rio.Page(
+            name="Chat",
+            page_url='chat',
+            build=pages.ChatPage,
+        ),
+
+        rio.Page(
+            name="Fleet",
+            page_url='fleet',
+            build=pages.FleetPage,
+        ),
+    ]
+    # The diagnostics page exposes internals, so it only exists when it has
+    # been explicitly enabled.
+    + (
+        [
+            rio.Page(
+                name="Diagnostics",
+                page_url='diagnostics',
+                build=pages.DiagnosticsPage,
+            ),
+        ]
+        if diagnostics.enabled
+        else []
+    ),
     # You can optionally provide a root component for the app. By default,
     # a simple `rio.PageView` is used. By providing your own component, you
     # can create components which stay put while the user navigates between
@@ -53,6 +86,22 @@ app = rio.App(
     # so the currently active page is still visible.
     build=pages.RootPage,
     theme=theme,
-    assets_dir=Path(__file__).parent / "assets",
+    assets_dir=assets.ASSETS_DIR,
+    # Loaded from the browser when a session starts, so unsaved form state
+    # survives reconnects.
+    default_attachments=[page_state.PageState()],
 )
 
+
+def as_fastapi():
+    """
+    Creates the ASGI app for production deployments. On top of what Rio
+    serves, this exposes the content-hashed static assets with long-lived
+    cache headers and precompressed variants.
+
+    Run it with `uvicorn --factory agixt:as_fastapi`.
+    """
+    fastapi_app = app.as_fastapi()
+    assets.mount(fastapi_app)
+    return fastapi_app
+
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from typing import *  # type: ignore
+
+import rio
+
+from . import log
+
+
+class AdmissionError(Exception):
+    """
+    Raised when a backend call would exceed the caller's budget, and waiting
+    for budget to free up would take too long.
+    """
+
+
+@dataclass(frozen=True)
+class Budget:
+    # Sustained number of backend calls per second.
+    rate: float
+
+    # How many calls may be made in a quick burst before `rate` applies.
+    burst: int
+
+    # How many calls may be in flight at the same time.
+    concurrency: int
+
+
+SESSION_BUDGET = Budget(rate=5, burst=20, concurrency=4)
+USER_BUDGET = Budget(rate=10, burst=40, concurrency=8)
+
+# Upper limit on concurrent calls from this worker to AGiXT, across all users.
+GLOBAL_CONCURRENCY = 16
+
+# How long a call may wait for budget when there's no cached value to fall
+# back to.
+MAX_QUEUE_WAIT = 2.0
+
+# Users which haven't made a call for this long are forgotten.
+USER_IDLE_TIMEOUT = 600.0
+
+# How many reverse proxies (load balancers and the like) sit in front of the
+# workers. Each of them appends the address it received the request from to
+# `CLIENT_IP_HEADER`, so the user is the address added by the outermost one.
+# Zero means browsers connect to the workers directly.
+TRUSTED_PROXIES = int(os.environ.get("AGIXT_TRUSTED_PROXIES", "0"))
+CLIENT_IP_HEADER = os.environ.get("AGIXT_CLIENT_IP_HEADER", "X-Forwarded-For")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Takes a token, waiting up to `timeout` seconds for one to become
+        available. Returns whether a token was taken.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+
+            wait = (1 - self._tokens) / self.rate
+
+            if wait > timeout:
+                return False
+
+            # Reserve the token now, so concurrent callers queue up behind
+            # this one instead of all waking up at the same time.
+            self._tokens -= 1
+
+        time.sleep(wait)
+        return True
+
+    def refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class Limiter:
+    """
+    Enforces a `Budget`: a token bucket for the call rate and a semaphore for
+    the number of concurrent calls.
+    """
+
+    def __init__(self, budget: Budget) -> None:
+        self.bucket = TokenBucket(budget.rate, budget.burst)
+        self.slots = threading.BoundedSemaphore(budget.concurrency)
+        self.last_used = time.monotonic()
+
+
+_global_slots = threading.BoundedSemaphore(GLOBAL_CONCURRENCY)
+
+_session_limiters: "weakref.WeakKeyDictionary[rio.Session, Limiter]" = weakref.WeakKeyDictionary()
+_user_limiters: Dict[str, Limiter] = {}
+_registry_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Client:
+    session: Optional[rio.Session]
+    user: Optional[str]
+
+
+_current_client: contextvars.ContextVar[Optional[Client]] = contextvars.ContextVar(
+    "agixt_admission_client",
+    default=None,
+)
+
+
+def _user_of(session: rio.Session) -> Optional[str]:
+    """
+    Returns the address of the user behind `session`, or `None` if it can't
+    be trusted, in which case the session isn't subject to a user budget.
+    The UI has no logins, so the address is the closest thing to a user
+    identity available.
+    """
+    headers = getattr(session, "http_headers", None) or {}
+    forwarded = headers.get(CLIENT_IP_HEADER.lower())
+
+    if TRUSTED_PROXIES <= 0:
+        # A forwarded request means the connection came from a proxy, which
+        # all users behind it would share. The header itself can't be
+        # trusted, since anybody could have set it.
+        return None if forwarded else getattr(session, "client_ip", None)
+
+    addresses = [address.strip() for address in (forwarded or "").split(",") if address.strip()]
+
+    # Addresses further left were supplied by the client and could be forged.
+    if len(addresses) < TRUSTED_PROXIES:
+        return None
+
+    return addresses[-TRUSTED_PROXIES]
+
+
+@contextmanager
+def client(session: rio.Session) -> Iterator[None]:
+    """
+    Attributes all backend calls made within the block to `session` and its
+    user, both for admission control and in the logs.
+    """
+    token = _current_client.set(Client(session=session, user=_user_of(session)))
+
+    try:
+        with log.session_scope(session):
+            yield
+    finally:
+        _current_client.reset(token)
+
+
+def _limiters_for(current: Optional[Client]) -> List[Limiter]:
+    if current is None:
+        return []
+
+    now = time.monotonic()
+    limiters = []
+
+    with _registry_lock:
+        if current.session is not None:
+            limiter = _session_limiters.get(current.session)
+
+            if limiter is None:
+                limiter = _session_limiters[current.session] = Limiter(SESSION_BUDGET)
+
+            limiters.append(limiter)
+
+        if current.user is not None:
+            for user, idle in list(_user_limiters.items()):
+                if now - idle.last_used > USER_IDLE_TIMEOUT:
+                    del _user_limiters[user]
+
+            limiter = _user_limiters.get(current.user)
+
+            if limiter is None:
+                limiter = _user_limiters[current.user] = Limiter(USER_BUDGET)
+
+            limiters.append(limiter)
+
+    for limiter in limiters:
+        limiter.last_used = now
+
+    return limiters
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    return True
+
+
+@contextmanager
+def admit(timeout: float = MAX_QUEUE_WAIT) -> Iterator[None]:
+    """
+    Holds the block until the current client (see `client`) is within its
+    rate and concurrency budget, and the worker is below its global
+    concurrency limit. Raises `AdmissionError` if that takes longer than
+    `timeout` seconds.
+
+    Waiting on the event loop's thread would stall every session, so there
+    the budget is only checked, never waited for.
+    """
+    if _on_event_loop():
+        timeout = 0
+
+    deadline = time.monotonic() + timeout
+    limiters = _limiters_for(_current_client.get())
+    taken: List[Limiter] = []
+
+    for limiter in limiters:
+        if not limiter.bucket.acquire(max(deadline - time.monotonic(), 0)):
+            for other in taken:
+                other.bucket.refund()
+
+            raise AdmissionError("Rate limit exceeded")
+
+        taken.append(limiter)
+
+    with ExitStack() as stack:
+        for slots in [*(limiter.slots for limiter in limiters), _global_slots]:
+            if not slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                # The call is never made, so it doesn't count against the rate
+                # either.
+                for limiter in taken:
+                    limiter.bucket.refund()
+
+                raise AdmissionError("Too many concurrent requests")
+
+            stack.callback(slots.release)
+
+        yield
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import *  # type: ignore
+
+from agixtsdk import AGiXTSDK
+
+from . import admission
+from . import resilience
+from .cache import Cache, backend_from_environment
+
+# Initialize API Client
+base_uri = os.environ.get("AGIXT_URI", "http://localhost:7437")
+api_key = os.environ.get("AGIXT_API_KEY", "your_agixt_api_key")
+ApiClient = AGiXTSDK(base_uri=base_uri, api_key=api_key)
+
+# The provider services the agent management page asks about.
+PROVIDER_SERVICES = ["llm", "vision", "tts", "transcription", "image", "embeddings"]
+
+# Catalog data shared by all sessions. Catalogs rarely change, so reading them
+# from here instead of the backend keeps page builds fast. Set
+# `AGIXT_CACHE_PATH` to share the cache between worker processes.
+cache = Cache(default_ttl=60, backend=backend_from_environment())
+
+_MISSING = object()
+
+# While reading in `cached_only` mode, the keys of expired entries which were
+# returned are collected here.
+_cached_only: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar(
+    "agixt_api_cached_only",
+    default=None,
+)
+
+
+# Functions which adjust values on their way out of the cache, e.g. to show
+# changes which haven't reached the backend yet. Each is called with the cache
+# key and the value, and returns the value to use instead. They must not
+# modify the cached value itself.
+Overlay = Callable[[str, Any], Any]
+
+_overlays: List[Overlay] = []
+
+
+def add_overlay(overlay: Overlay) -> None:
+    _overlays.append(overlay)
+
+
+class NotCached(LookupError):
+    """
+    Raised by reads within `cached_only` when there is nothing cached to
+    return.
+    """
+
+
+@contextmanager
+def cached_only() -> Iterator[List[str]]:
+    """
+    Within the block, reads never call the backend. They return whatever is
+    cached, even if it has expired, and raise `NotCached` otherwise. Yields a
+    list, which receives the keys of expired entries that were returned.
+
+    Pages use this to show what's already known right away, and load missing
+    or expired data in the background.
+    """
+    stale: List[str] = []
+    token = _cached_only.set(stale)
+
+    try:
+        yield stale
+    finally:
+        _cached_only.reset(token)
+
+
+def _read(key: str, endpoint: str, loader: Callable[[], Any]) -> Any:
+    """
+    Returns the cached value for `key`, loading it through the resilience
+    layer if needed. If the backend is slow or unavailable, or the caller is
+    over its call budget, the last known good value is returned instead, if
+    there is one.
+    """
+    value = _read_cached(key, endpoint, loader)
+
+    for overlay in _overlays:
+        value = overlay(key, value)
+
+    return value
+
+
+def _read_cached(key: str, endpoint: str, loader: Callable[[], Any]) -> Any:
+    stale = _cached_only.get()
+
+    if stale is not None:
+        value = cache.get(key, _MISSING)
+
+        if value is not _MISSING:
+            return value
+
+        value = cache.get(key, _MISSING, allow_stale=True)
+
+        if value is _MISSING:
+            raise NotCached(key)
+
+        stale.append(key)
+        return value
+
+    def load() -> Any:
+        # Callers which can fall back to a stale value don't wait for budget
+        # to free up. Everybody else queues for a bit.
+        has_fallback = cache.get(key, _MISSING, allow_stale=True) is not _MISSING
+
+        with admission.admit(timeout=0 if has_fallback else admission.MAX_QUEUE_WAIT):
+            return resilience.call(endpoint, loader)
+
+    try:
+        return cache.get_or_load(key, load)
+    except Exception:
+        stale = cache.get(key, _MISSING, allow_stale=True)
+
+        if stale is _MISSING:
+            raise
+
+        return stale
+
+
+def get_agents() -> List[Dict[str, Any]]:
+    return _read("agents", "get_agents", ApiClient.get_agents)
+
+
+def get_providers() -> List[str]:
+    return _read("providers", "get_providers", ApiClient.get_providers)
+
+
+def get_providers_by_service(service: str) -> List[str]:
+    return _read(
+        f"providers_by_service:{service}",
+        "get_providers_by_service",
+        lambda: ApiClient.get_providers_by_service(service),
+    )
+
+
+def get_provider_settings(provider_name: str) -> Dict[str, Any]:
+    # Callers merge their own values into the result, so hand out a copy
+    # instead of the cached dictionary.
+    return dict(
+        _read(
+            f"provider_settings:{provider_name}",
+            "get_provider_settings",
+            lambda: ApiClient.get_provider_settings(provider_name=provider_name),
+        )
+    )
+
+
+def get_extension_settings() -> Dict[str, Dict[str, Any]]:
+    return _read(
+        "extension_settings",
+        "get_extension_settings",
+        ApiClient.get_extension_settings,
+    )
+
+
+def get_agentconfig(agent_name: str) -> Dict[str, Any]:
+    return _read(
+        f"agentconfig:{agent_name}",
+        "get_agentconfig",
+        lambda: ApiClient.get_agentconfig(agent_name),
+    )
+
+
+def get_chains() -> List[str]:
+    return _read("chains", "get_chains", ApiClient.get_chains)
+
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+from typing import *  # type: ignore
+
+from fastapi import Request, Response
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+# All static files shipped with the app live here. Nothing on the first paint
+# should have to be fetched from a third-party host.
+ASSETS_DIR = Path(__file__).parent / "assets"
+
+# URL prefix the hashed assets are served under.
+URL_PREFIX = "/static"
+
+# Assets up to this size are inlined as data URIs instead of being requested
+# separately.
+INLINE_LIMIT = 4 * 1024
+
+# Assets needed on the first paint are always inlined, whatever their size.
+# The hashed URLs are only served by the production entry point, so this also
+# keeps them working under `rio run`.
+CRITICAL_ASSETS = frozenset({"AGiXT-gradient-light.svg"})
+
+# Hashed filenames never change their content, so browsers may keep them
+# forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class Asset:
+    """
+    A static file together with its content-hashed name and precompressed
+    variants.
+    """
+
+    name: str
+    hashed_name: str
+    media_type: str
+    raw: bytes
+    gzip: bytes
+    brotli: Optional[bytes]
+
+    @property
+    def url(self) -> str:
+        return f"{URL_PREFIX}/{self.hashed_name}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.hashed_name}"'
+
+    def data_uri(self) -> str:
+        # Base64 avoids having to worry about quotes inside HTML attributes.
+        encoded = base64.b64encode(self.raw).decode("ascii")
+        return f"data:{self.media_type};base64,{encoded}"
+
+
+def _load(path: Path) -> Asset:
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    return Asset(
+        name=path.name,
+        hashed_name=f"{path.stem}.{digest}{path.suffix}",
+        media_type=media_type,
+        raw=raw,
+        gzip=gzip.compress(raw, compresslevel=9, mtime=0),
+        brotli=brotli.compress(raw) if brotli is not None else None,
+    )
+
+
+class AssetManifest:
+    """
+    Maps the original asset names to their hashed counterparts. The whole
+    directory is hashed and compressed once, when the manifest is created, so
+    requests never pay for it.
+    """
+
+    def __init__(self, directory: Path = ASSETS_DIR) -> None:
+        self.by_name: Dict[str, Asset] = {}
+        self.by_hashed_name: Dict[str, Asset] = {}
+
+        if not directory.is_dir():
+            return
+
+        for path in sorted(directory.rglob("*")):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+
+            asset = _load(path)
+            self.by_name[asset.name] = asset
+            self.by_hashed_name[asset.hashed_name] = asset
+
+    def __getitem__(self, name: str) -> Asset:
+        return self.by_name[name]
+
+    def url(self, name: str) -> str:
+        """
+        Returns the URL to reference the asset with. Small and critical assets
+        are inlined as data URIs, everything else points to the hashed,
+        cacheable URL.
+        """
+        asset = self.by_name[name]
+
+        if name in CRITICAL_ASSETS or len(asset.raw) <= INLINE_LIMIT:
+            return asset.data_uri()
+
+        return asset.url
+
+
+manifest = AssetManifest()
+
+
+def url(name: str) -> str:
+    return manifest.url(name)
+
+
+def _pick_encoding(asset: Asset, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in accept_encoding.split(",")
+    }
+
+    if asset.brotli is not None and "br" in accepted:
+        return asset.brotli, "br"
+
+    if "gzip" in accepted:
+        return asset.gzip, "gzip"
+
+    return asset.raw, None
+
+
+def mount(fastapi_app: Any, prefix: str = URL_PREFIX) -> None:
+    """
+    Adds a route serving the hashed assets to the given FastAPI app. Responses
+    carry long-lived cache headers and use the precompressed variant the
+    browser supports.
+    """
+
+    async def serve_asset(hashed_name: str, request: Request) -> Response:
+        asset = manifest.by_hashed_name.get(hashed_name)
+
+        if asset is None:
+            return Response(status_code=404)
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "ETag": asset.etag,
+            "Vary": "Accept-Encoding",
+        }
+
+        if request.headers.get("if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+
+        body, encoding = _pick_encoding(
+            asset, request.headers.get("accept-encoding", "")
+        )
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    fastapi_app.add_api_route(
+        f"{prefix}/{{hashed_name:path}}",
+        serve_asset,
+        methods=["GET"],
+        include_in_schema=False,
+    )
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from pathlib import Path
+from typing import *  # type: ignore
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """
+    Stores cache entries. Entries are `(expires_at, value)` pairs, where
+    `expires_at` is a wall-clock timestamp, so it means the same thing in
+    every process sharing the backend.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """
+        Returns the entry for `key`, even if it has expired, or `None` if
+        there is none.
+        """
+
+    @abstractmethod
+    def set(self, key: str, expires_at: float, value: Any) -> None:
+        """
+        Stores `value` under `key`, replacing any previous entry.
+        """
+
+    @abstractmethod
+    def expire(self, key: str) -> None:
+        """
+        Marks the entry for `key` as expired, but keeps its value, so it can
+        still be used as a fallback.
+        """
+
+    @abstractmethod
+    def expire_prefix(self, prefix: str) -> None:
+        """
+        Like `expire`, for every entry whose key starts with `prefix`.
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Keeps entries in a dictionary. Each process has its own copy.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, expires_at: float, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+
+    def expire(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries[key] = (0.0, entry[1])
+
+    def expire_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key.startswith(prefix):
+                    self._entries[key] = (0.0, entry[1])
+
+
+class SqliteBackend(CacheBackend):
+    """
+    Keeps entries in an SQLite database, so all worker processes on a machine
+    share them. Values are stored as JSON and only decoded when read, which
+    keeps each worker's memory flat, and a freshly started worker finds the
+    cache already warm.
+
+    Put the database on a tmpfs such as `/dev/shm` to keep it in shared
+    memory.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = str(path)
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL,"
+                " value TEXT NOT NULL"
+                ")"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared between threads, so each thread
+        # opens its own.
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        return connection
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        row = self._connection().execute(
+            "SELECT expires_at, value FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, expires_at: float, value: Any) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value)),
+            )
+
+    def expire(self, key: str) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE entries SET expires_at = 0 WHERE key = ?",
+                (key,),
+            )
+
+    def expire_prefix(self, prefix: str) -> None:
+        # Escape the LIKE wildcards, so the prefix is matched literally.
+        pattern = (
+            prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            + "%"
+        )
+
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE entries SET expires_at = 0 WHERE key LIKE ? ESCAPE '\\'",
+                (pattern,),
+            )
+
+
+def backend_from_environment() -> CacheBackend:
+    """
+    Uses the SQLite backend if `AGIXT_CACHE_PATH` is set, and a per-process
+    in-memory cache otherwise.
+    """
+    path = os.environ.get("AGIXT_CACHE_PATH")
+
+    if path:
+        return SqliteBackend(path)
+
+    return MemoryBackend()
+
+
+class Cache:
+    """
+    A small thread-safe TTL cache shared by all sessions of the app. Where the
+    entries live is up to the `CacheBackend`.
+
+    Loads are single-flight: if several callers ask for the same missing key at
+    once (e.g. a prefetch and the page build racing each other), the loader
+    only runs once and everybody receives its result.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 60.0,
+        backend: Optional[CacheBackend] = None,
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.backend = MemoryBackend() if backend is None else backend
+
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None, *, allow_stale: bool = False) -> Any:
+        """
+        Returns the cached value, or `default` if the key is missing or has
+        expired. If `allow_stale` is set, expired values are returned as well.
+        This is useful as a last-known-good fallback when the backend is down.
+        """
+        entry = self.backend.get(key)
+
+        if entry is None:
+            return default
+
+        if entry[0] < time.time() and not allow_stale:
+            return default
+
+        return entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        self.backend.set(key, expires_at, value)
+
+    # Invalidated entries are marked as expired rather than dropped, so they
+    # can still serve as stale fallback values.
+    def invalidate(self, key: str) -> None:
+        self.backend.expire(key)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        self.backend.expire_prefix(prefix)
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], T],
+        ttl: Optional[float] = None,
+    ) -> T:
+        """
+        Returns the cached value for `key`, calling `loader` to fetch it if
+        necessary.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+
+        if value is not sentinel:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        assert future is not None
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
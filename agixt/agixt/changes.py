@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import weakref
+from typing import *  # type: ignore
+
+from . import api
+from . import resilience
+from .api import ApiClient
+
+# AGiXT doesn't push change notifications, so the watcher polls the catalog
+# endpoints instead. Only topics somebody is subscribed to are polled, and
+# subscribers are only notified when the content actually changed.
+POLL_INTERVAL = float(os.environ.get("AGIXT_POLL_INTERVAL", "10"))
+
+# Topics are named after the cache keys they invalidate. Each maps to the
+# endpoint and loader used to check for changes.
+CATALOG_TOPICS: Dict[str, Tuple[str, Callable[[], Any]]] = {
+    "agents": ("get_agents", ApiClient.get_agents),
+    "chains": ("get_chains", ApiClient.get_chains),
+    "extension_settings": ("get_extension_settings", ApiClient.get_extension_settings),
+}
+
+AGENTCONFIG_PREFIX = "agentconfig:"
+
+# Subscribers of this topic hear about changes to any agent's config. It isn't
+# polled itself, since that would mean polling every single agent.
+ANY_AGENTCONFIG = f"{AGENTCONFIG_PREFIX}*"
+
+Callback = Callable[[str], Awaitable[None]]
+
+
+def _fingerprint(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _loader_for(topic: str) -> Optional[Tuple[str, Callable[[], Any]]]:
+    if topic == ANY_AGENTCONFIG:
+        return None
+
+    if topic in CATALOG_TOPICS:
+        return CATALOG_TOPICS[topic]
+
+    if topic.startswith(AGENTCONFIG_PREFIX):
+        agent_name = topic[len(AGENTCONFIG_PREFIX):]
+        return "get_agentconfig", lambda: ApiClient.get_agentconfig(agent_name)
+
+    return None
+
+
+class ChangeWatcher:
+    """
+    Keeps the shared cache up to date and tells subscribed components when
+    something they display has changed.
+
+    Subscriptions are held weakly, so components don't have to unsubscribe
+    and closed sessions don't keep them alive.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL) -> None:
+        self.poll_interval = poll_interval
+
+        self._subscribers: Dict[str, List[weakref.ref]] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, callback: Callback) -> None:
+        """
+        Calls `callback(topic)` whenever the data behind `topic` changes.
+        Subscribing the same callback twice has no effect. Must be called from
+        within the event loop.
+        """
+        ref = (
+            weakref.WeakMethod(callback)
+            if hasattr(callback, "__self__")
+            else weakref.ref(callback)
+        )
+
+        with self._lock:
+            refs = self._subscribers.setdefault(topic, [])
+
+            if ref not in refs:
+                refs.append(ref)
+
+        # Whatever is cached right now is what the subscriber displays, so
+        # that's the baseline to detect changes against.
+        if topic not in self._fingerprints:
+            cached = api.cache.get(topic, allow_stale=True)
+
+            if cached is not None:
+                self._fingerprints[topic] = _fingerprint(cached)
+
+        self._ensure_running()
+
+    def _live_callbacks(self, topic: str) -> List[Callback]:
+        with self._lock:
+            refs = [ref for ref in self._subscribers.get(topic, []) if ref() is not None]
+
+            if refs:
+                self._subscribers[topic] = refs
+            else:
+                self._subscribers.pop(topic, None)
+
+        return [callback for callback in (ref() for ref in refs) if callback is not None]
+
+    def publish(self, topic: str) -> None:
+        """
+        Marks the cache entry for `topic` as stale and notifies its
+        subscribers. Safe to call from any thread.
+        """
+        api.cache.invalidate(topic)
+        self._fingerprints.pop(topic, None)
+        self._notify(topic)
+
+    def _notify(self, topic: str) -> None:
+        loop = self._loop
+
+        if loop is None or loop.is_closed():
+            return
+
+        callbacks = self._live_callbacks(topic)
+
+        if topic.startswith(AGENTCONFIG_PREFIX) and topic != ANY_AGENTCONFIG:
+            callbacks += self._live_callbacks(ANY_AGENTCONFIG)
+
+        for callback in callbacks:
+            loop.call_soon_threadsafe(lambda cb=callback: loop.create_task(cb(topic)))
+
+    def _ensure_running(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            with self._lock:
+                topics = list(self._subscribers)
+
+            for topic in topics:
+                if not self._live_callbacks(topic):
+                    self._fingerprints.pop(topic, None)
+                    continue
+
+                await self._check(topic)
+
+    async def _check(self, topic: str) -> None:
+        spec = _loader_for(topic)
+
+        if spec is None:
+            return
+
+        endpoint, loader = spec
+
+        try:
+            value = await asyncio.to_thread(resilience.call, endpoint, loader)
+        except Exception:
+            # The backend is unhealthy. Keep serving what's cached and try
+            # again on the next round.
+            return
+
+        fingerprint = _fingerprint(value)
+        previous = self._fingerprints.get(topic)
+        self._fingerprints[topic] = fingerprint
+
+        # Store the fresh value either way, so the cache doesn't expire and
+        # trigger a refetch during the next page build.
+        api.cache.set(topic, value)
+
+        if previous is not None and previous != fingerprint:
+            if topic == "agents":
+                self._drop_removed_agents(value)
+
+            self._notify(topic)
+
+    def _drop_removed_agents(self, agents: List[Dict[str, Any]]) -> None:
+        names = {agent.get("name") for agent in agents}
+
+        with self._lock:
+            topics = list(self._subscribers)
+
+        for topic in topics:
+            if topic.startswith(AGENTCONFIG_PREFIX) and topic[len(AGENTCONFIG_PREFIX):] not in names:
+                self.publish(topic)
+
+
+watcher = ChangeWatcher()
+
+
+def subscribe(topic: str, callback: Callback) -> None:
+    watcher.subscribe(topic, callback)
+
+
+def publish(topic: str) -> None:
+    watcher.publish(topic)
+
+
+def notify(topic: str) -> None:
+    """
+    Notifies the subscribers of `topic` without touching the cache. Use this
+    for state which doesn't come from the backend.
+    """
+    watcher._notify(topic)
+
+
+def agentconfig_topic(agent_name: str) -> str:
+    return f"{AGENTCONFIG_PREFIX}{agent_name}"
+
+
+def agent_changed(agent_name: str) -> None:
+    """
+    Call this after modifying an agent, so every open session picks up the
+    change right away instead of on the next poll.
+    """
+    publish("agents")
+    publish(agentconfig_topic(agent_name))
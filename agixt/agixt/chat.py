@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import *  # type: ignore
+
+import requests
+
+from . import api
+
+# How long to wait for the backend to accept the request, and for each new
+# chunk once the response is streaming.
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+
+# Streams hold a thread for as long as the agent keeps talking, so they get a
+# pool of their own, rather than tying up the one shared by all other
+# background work. Completions beyond this limit wait for a free thread.
+MAX_STREAMS = int(os.environ.get("AGIXT_MAX_CHAT_STREAMS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_STREAMS, thread_name_prefix="agixt-chat")
+
+
+class TokenStream:
+    """
+    Collects the chunks of a streamed completion until the UI picks them up.
+
+    The UI doesn't render every chunk as it arrives. Instead it drains the
+    stream at a fixed frame rate, so a verbose agent results in a bounded
+    number of updates no matter how small its chunks are.
+    """
+
+    def __init__(self) -> None:
+        self.done = False
+        self.error: Optional[str] = None
+
+        self._chunks: List[str] = []
+        self._cancelled = threading.Event()
+        self._response: Optional[requests.Response] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """
+        Stops receiving the completion, e.g. because nobody is looking at it
+        anymore. Safe to call from any thread.
+        """
+        self._cancelled.set()
+
+        with self._lock:
+            response = self._response
+
+        # Closing the connection wakes up the thread waiting for the next
+        # chunk, at least on most platforms. Otherwise it exits once that
+        # chunk arrives.
+        if response is not None:
+            response.close()
+
+    def _attach(self, response: requests.Response) -> None:
+        with self._lock:
+            self._response = response
+
+    def push(self, chunk: str) -> None:
+        with self._lock:
+            self._chunks.append(chunk)
+
+    def drain(self) -> str:
+        """
+        Returns everything received since the last call.
+        """
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+
+        return "".join(chunks)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.error = error
+        self.done = True
+
+
+def _parse_event(line: str) -> Optional[str]:
+    """
+    Extracts the text from a single line of a server-sent event stream, in
+    the format of OpenAI's chat completions API.
+    """
+    if not line.startswith("data:"):
+        return None
+
+    data = line[len("data:"):].strip()
+
+    if not data or data == "[DONE]":
+        return None
+
+    choice = json.loads(data)["choices"][0]
+    return (choice.get("delta") or choice.get("message") or {}).get("content")
+
+
+def _stream_into(
+    stream: TokenStream,
+    agent_name: str,
+    user_input: str,
+    conversation_name: str,
+) -> None:
+    # The completion may have been cancelled while waiting for a thread.
+    if stream.is_cancelled:
+        return
+
+    response = requests.post(
+        f"{api.base_uri}/v1/chat/completions",
+        headers=api.ApiClient.headers,
+        json={
+            "model": agent_name,
+            "messages": [{"role": "user", "content": user_input}],
+            "user": conversation_name,
+            "stream": True,
+        },
+        stream=True,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+    )
+
+    stream._attach(response)
+
+    with response:
+        if stream.is_cancelled:
+            return
+
+        response.raise_for_status()
+
+        # Backends which don't support streaming answer with a single, regular
+        # JSON response. Treat that as one big chunk.
+        if "text/event-stream" not in response.headers.get("content-type", ""):
+            content = response.json()["choices"][0]["message"]["content"]
+            stream.push(content)
+            return
+
+        for line in response.iter_lines(decode_unicode=True):
+            if stream.is_cancelled:
+                return
+
+            chunk = _parse_event(line or "")
+
+            if chunk:
+                stream.push(chunk)
+
+
+async def stream_completion(
+    stream: TokenStream,
+    agent_name: str,
+    user_input: str,
+    conversation_name: str,
+) -> None:
+    """
+    Asks `agent_name` to respond to `user_input` and feeds the response into
+    `stream` as it arrives. The stream is always finished when this returns,
+    with `stream.error` set if something went wrong. Cancelling the task
+    cancels the stream as well.
+    """
+    loop = asyncio.get_running_loop()
+
+    try:
+        await loop.run_in_executor(_executor, _stream_into, stream, agent_name, user_input, conversation_name)
+    except asyncio.CancelledError:
+        stream.cancel()
+        stream.finish(error="Cancelled")
+        raise
+    except Exception as err:
+        if stream.is_cancelled:
+            stream.finish(error="Cancelled")
+            return
+
+        stream.finish(error=str(err))
+    else:
+        stream.finish()
@@ -1,3 +1,5 @@
 from .navbar import Navbar
 from .footer import Footer
 from .testimonial import Testimonial
+from .save_status import SaveStatusList
+from .chat_message import ChatMessage
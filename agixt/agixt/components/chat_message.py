@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+from dataclasses import KW_ONLY, dataclass, field
+from typing import *  # type: ignore
+
+import rio
+
+from .. import chat
+from .. import components as comps
+
+# How often a streaming message is updated, per second. Chunks arriving in
+# between are batched into a single update.
+FRAME_RATE = 15
+
+_ids = itertools.count()
+
+
+@dataclass(eq=False)
+class ChatEntry:
+    """
+    A single message in a conversation. While an agent's response is still
+    streaming in, `stream` holds the chunks which haven't been displayed yet.
+    """
+
+    role: str
+    text: str = ""
+    stream: Optional[chat.TokenStream] = None
+    id: int = field(default_factory=lambda: next(_ids))
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.stream is not None and not self.stream.done
+
+
+class ChatMessage(rio.Component):
+    """
+    Displays a chat message. If the message is still streaming, the component
+    appends new chunks to itself, so only this message is rebuilt rather than
+    the whole conversation.
+    """
+
+    entry: ChatEntry
+
+    _text: str = ""
+    _is_rendering: bool = False
+
+    @rio.event.on_populate
+    def _on_populate(self) -> None:
+        self._text = self.entry.text
+
+        if self.entry.stream is not None and not self._is_rendering:
+            self._is_rendering = True
+            asyncio.create_task(self._render_stream())
+
+    async def _render_stream(self) -> None:
+        stream = self.entry.stream
+        assert stream is not None
+
+        while True:
+            # Check this before draining, so chunks pushed right before the
+            # stream finished are still picked up.
+            is_done = stream.done
+            new_text = stream.drain()
+
+            if new_text:
+                self.entry.text += new_text
+                self._text = self.entry.text
+
+            if is_done:
+                break
+
+            await asyncio.sleep(1 / FRAME_RATE)
+
+        if stream.error is not None:
+            self.entry.text += f"\n\n⚠️ {stream.error}"
+            self._text = self.entry.text
+
+        self.entry.stream = None
+        self._is_rendering = False
+
+    def build(self) -> rio.Component:
+        is_user = self.entry.role == "user"
+
+        return rio.Card(
+            rio.Column(
+                rio.Text(
+                    "You" if is_user else "Agent",
+                    style="dim",
+                    justify="left",
+                ),
+                rio.Markdown(self._text or "…"),
+                spacing=0.4,
+                margin=1,
+            ),
+            color="primary" if is_user else "neutral",
+            align_x=1 if is_user else 0,
+            width=40,
+        )
@@ -6,6 +6,8 @@ from typing import *  # type: ignore
 import rio
 
 from .. import components as comps
+from .. import admission
+from .. import prefetch
 
 class Navbar(rio.Component):
     """
@@ -26,6 +28,27 @@ class Navbar(rio.Component):
         # refresh.
         await self.force_refresh()
 
+    # Most visitors go on to open one of the linked pages, so start loading
+    # their data as soon as the navbar is shown. This is best effort and
+    # doesn't block the build.
+    @rio.event.on_populate
+    def on_populate(self) -> None:
+        for page_url in ("agent_management", "chain_management", "chat", "fleet"):
+            self._prefetch(page_url)
+
+    def _prefetch(self, page_url: str) -> None:
+        with admission.client(self.session):
+            prefetch.prefetch(page_url)
+
+    def _nav_link(self, content: rio.Component, page_url: str) -> rio.Component:
+        # Hovering over a link is a strong hint that it's about to be clicked.
+        # Refresh that page's data now, so the navigation lands on a warm
+        # cache.
+        return rio.MouseEventListener(
+            rio.Link(content, page_url),
+            on_mouse_enter=lambda _: self._prefetch(page_url),
+        )
+
     def build(self) -> rio.Component:
         # Which page is currently active? This will be used to highlight the
         # correct navigation button.
@@ -64,7 +87,7 @@ class Navbar(rio.Component):
                         # having to write an event handler. Notice how there is
                         # no Python function called when the button is clicked.
 
-                            rio.Link(
+                        self._nav_link(
                             rio.Button(
                                 "Agent Management",
                                 icon="robot-2",
@@ -77,7 +100,7 @@ class Navbar(rio.Component):
                             "/agent_management",
                         ),
 
-                        rio.Link(
+                        self._nav_link(
                             rio.Button(
                                 "Chain Management",
                                 icon="material/link",
@@ -89,6 +112,32 @@ class Navbar(rio.Component):
                             ),
                             "/chain_management",
                         ),
+
+                        self._nav_link(
+                            rio.Button(
+                                "Chat",
+                                icon="material/chat",
+                                style=(
+                                    "major"
+                                    if active_page_url_segment == "chat"
+                                    else "plain"
+                                ),
+                            ),
+                            "/chat",
+                        ),
+
+                        self._nav_link(
+                            rio.Button(
+                                "Fleet",
+                                icon="material/table_chart",
+                                style=(
+                                    "major"
+                                    if active_page_url_segment == "fleet"
+                                    else "plain"
+                                ),
+                            ),
+                            "/fleet",
+                        ),
                         # Same game, different button
                         spacing=1,
                         margin=1,
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from dataclasses import KW_ONLY, field
+from typing import *  # type: ignore
+
+import rio
+
+from .. import changes
+from .. import save_queue
+from .. import components as comps
+
+class SaveStatusList(rio.Component):
+    """
+    Shows which agent changes are still on their way to the backend, and
+    which ones failed. Saved agents are not listed.
+    """
+
+    @rio.event.on_populate
+    def _subscribe_to_changes(self) -> None:
+        changes.subscribe(save_queue.STATUS_TOPIC, self._on_status_changed)
+
+    async def _on_status_changed(self, topic: str) -> None:
+        await self.force_refresh()
+
+    def _describe(self, agent_name: str, status: save_queue.SaveStatus) -> str:
+        if status.state == "failed":
+            return f"❌ {agent_name}: {status.action} failed after {status.attempts} attempts ({status.error})"
+
+        if status.state == "saving":
+            return f"⏳ {agent_name}: saving ({status.action})"
+
+        if status.error is not None:
+            return f"🔁 {agent_name}: {status.action} will be retried ({status.error})"
+
+        return f"🕒 {agent_name}: {status.action} pending"
+
+    def build(self) -> rio.Component:
+        rows = []
+
+        for agent_name, status in save_queue.queue.statuses.items():
+            if status.state == "saved":
+                continue
+
+            children: List[rio.Component] = [
+                rio.Text(
+                    self._describe(agent_name, status),
+                    justify="left",
+                    style="text" if status.state == "failed" else "dim",
+                ),
+            ]
+
+            if status.state == "failed":
+                children.append(
+                    rio.Button(
+                        "Retry",
+                        on_press=lambda name=agent_name: save_queue.queue.retry(name),
+                        style="minor",
+                    )
+                )
+
+            rows.append(rio.Row(*children, spacing=1))
+
+        return rio.Column(*rows, spacing=0.5)
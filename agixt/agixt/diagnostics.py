@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import tracemalloc
+import weakref
+from dataclasses import dataclass, field
+from typing import *  # type: ignore
+
+import rio
+
+from . import log
+
+# Diagnostics cost memory and CPU themselves, so they are opt-in.
+enabled = os.environ.get("AGIXT_MEMORY_DIAGNOSTICS", "").lower() in ("1", "true", "yes")
+
+# How many frames tracemalloc records per allocation. More frames make the
+# allocation sites easier to understand, but are more expensive.
+TRACEMALLOC_FRAMES = 10
+
+# A component class is flagged as leaking if its retained size within a single
+# session grew in each of this many consecutive samples...
+GROWTH_SAMPLES = 5
+
+# ...by at least this many bytes in total.
+GROWTH_THRESHOLD = 64 * 1024
+
+# How often, in seconds, retained sizes are sampled in the background.
+SAMPLE_INTERVAL = 60.0
+
+if enabled and not tracemalloc.is_tracing():
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+_sessions: "weakref.WeakSet[rio.Session]" = weakref.WeakSet()
+# Retained sizes by `(session id, component class)`. Sessions are tracked
+# separately, since the totals also grow whenever more people connect.
+_history: Dict[Tuple[int, str], Deque[int]] = collections.defaultdict(
+    lambda: collections.deque(maxlen=GROWTH_SAMPLES + 1)
+)
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+_sampler: Optional[asyncio.Task] = None
+_lock = threading.Lock()
+
+logger = log.get_logger(__name__)
+
+
+def track_session(session: rio.Session) -> None:
+    """
+    Includes `session` in the reports. Does nothing unless diagnostics are
+    enabled. Must be called from within the event loop.
+    """
+    global _sampler
+
+    if not enabled:
+        return
+
+    _sessions.add(session)
+
+    if _sampler is None or _sampler.done():
+        _sampler = asyncio.get_running_loop().create_task(_sample_periodically())
+
+
+def _components_of(session: rio.Session) -> List[rio.Component]:
+    # Rio keeps a registry of every live component in a session. It's not
+    # public API, so be defensive about it.
+    registry = getattr(session, "_weak_components_by_id", None)
+
+    if registry is None:
+        return []
+
+    return list(registry.values())
+
+
+def _retained_size(obj: Any, seen: Set[int]) -> int:
+    """
+    Estimates how many bytes are kept alive by `obj`. Other components and
+    sessions aren't followed, since they are accounted for separately.
+    Objects already in `seen` are skipped, so shared data is counted once.
+    """
+    if isinstance(obj, (rio.Component, rio.Session, type)) or id(obj) in seen:
+        return 0
+
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        children: Iterable[Any] = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        children = obj
+    else:
+        return size
+
+    for child in children:
+        size += _retained_size(child, seen)
+
+    return size
+
+
+@dataclass
+class SessionReport:
+    session_id: int
+    component_count: int
+    retained_bytes: int
+    bytes_by_class: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class Report:
+    sessions: List[SessionReport]
+    bytes_by_class: Dict[str, int]
+
+    # Component classes whose retained size kept growing in some session.
+    growing_classes: List[str]
+
+    # Mutable objects which are referenced from more than one session, as
+    # `(component class, attribute)` pairs.
+    shared_attributes: List[Tuple[str, str]]
+
+    # The biggest allocation sites since the previous report.
+    top_allocations: List[str]
+
+
+def _top_allocations(limit: int) -> List[str]:
+    global _last_snapshot
+
+    if not tracemalloc.is_tracing():
+        return []
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+    )
+    previous, _last_snapshot = _last_snapshot, snapshot
+
+    if previous is None:
+        stats = snapshot.statistics("lineno")[:limit]
+    else:
+        stats = snapshot.compare_to(previous, "lineno")[:limit]
+
+    return [str(stat) for stat in stats]
+
+
+def _growing_classes() -> List[str]:
+    growing = set()
+
+    for (_, class_name), sizes in _history.items():
+        if len(sizes) <= GROWTH_SAMPLES:
+            continue
+
+        steps = [b - a for a, b in zip(sizes, list(sizes)[1:])]
+
+        if all(step > 0 for step in steps) and sizes[-1] - sizes[0] >= GROWTH_THRESHOLD:
+            growing.add(class_name)
+
+    return sorted(growing)
+
+
+def _measure() -> Tuple[List[SessionReport], Dict[str, int], List[Tuple[str, str]]]:
+    session_reports: List[SessionReport] = []
+    totals: Dict[str, int] = collections.defaultdict(int)
+    first_owner: Dict[int, int] = {}
+    shared: Set[Tuple[str, str]] = set()
+
+    for session in list(_sessions):
+        seen: Set[int] = set()
+        session_report = SessionReport(
+            session_id=id(session),
+            component_count=0,
+            retained_bytes=0,
+        )
+
+        for component in _components_of(session):
+            class_name = type(component).__name__
+            size = sys.getsizeof(component)
+
+            for attribute, value in vars(component).items():
+                if isinstance(value, (dict, list, set)) and value:
+                    owner = first_owner.setdefault(id(value), id(session))
+
+                    if owner != id(session):
+                        shared.add((class_name, attribute))
+
+                size += _retained_size(value, seen)
+
+            session_report.component_count += 1
+            session_report.retained_bytes += size
+            session_report.bytes_by_class[class_name] = (
+                session_report.bytes_by_class.get(class_name, 0) + size
+            )
+            totals[class_name] += size
+
+        session_reports.append(session_report)
+
+    # Classes which are gone from a session count as size 0, which ends
+    # their growth streak. Sessions which are gone are forgotten.
+    live_classes = {
+        (session_report.session_id, class_name): size
+        for session_report in session_reports
+        for class_name, size in session_report.bytes_by_class.items()
+    }
+    live_sessions = {session_report.session_id for session_report in session_reports}
+
+    for key in list(_history):
+        if key[0] not in live_sessions:
+            del _history[key]
+        elif key not in live_classes:
+            _history[key].append(0)
+
+    for key, size in live_classes.items():
+        _history[key].append(size)
+
+    return session_reports, dict(totals), sorted(shared)
+
+
+async def _sample_periodically() -> None:
+    while _sessions:
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+        with _lock:
+            _measure()
+            growing = _growing_classes()
+
+        if growing:
+            logger.warning(
+                "Retained size keeps growing for: %s",
+                ", ".join(growing),
+                extra={"event": "memory_growth", "classes": growing},
+            )
+
+
+def report(allocation_limit: int = 10) -> Report:
+    """
+    Measures all tracked sessions. Each call also counts as a sample for leak
+    detection, and compares allocations against the previous call.
+    """
+    with _lock:
+        session_reports, bytes_by_class, shared = _measure()
+
+        return Report(
+            sessions=session_reports,
+            bytes_by_class=bytes_by_class,
+            growing_classes=_growing_classes(),
+            shared_attributes=shared,
+            top_allocations=_top_allocations(allocation_limit),
+        )
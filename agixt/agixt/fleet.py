@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import *  # type: ignore
+
+from . import api
+from . import changes
+from . import log
+
+logger = log.get_logger(__name__)
+
+# How many agent configs are fetched at the same time during a full load.
+LOAD_CONCURRENCY = 8
+
+# Subscribers of this topic are told when the table has changed during a load,
+# at most once every `PROGRESS_INTERVAL` seconds.
+TOPIC = "fleet"
+PROGRESS_INTERVAL = 0.5
+
+# The value used for settings an agent doesn't have.
+MISSING = None
+
+
+def _encode(value: Any) -> Optional[str]:
+    # Settings can hold any JSON value. Encode all of them, strings included,
+    # so values are hashable and `1` and `"1"` are told apart, just like the
+    # backend does.
+    if value is None:
+        return MISSING
+
+    return json.dumps(value, sort_keys=True)
+
+
+def _decode(value: Optional[str]) -> Any:
+    return None if value is MISSING else json.loads(value)
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class FleetTable:
+    """
+    Agent settings, stored column by column for fast queries across many
+    agents.
+
+    Each agent occupies a row. Every setting is a column, and for every value
+    a column holds there is a bitmap (a Python `int`) with a bit set for each
+    row having that value. Filters, group-bys and diffs are therefore a
+    handful of bitwise operations per column or distinct value, rather than a
+    loop over all agents. Changing a single agent only touches that agent's
+    bits. Values in the bitmaps' keys and in query results are JSON-encoded.
+    """
+
+    def __init__(self) -> None:
+        self.columns: Dict[str, Dict[Optional[str], int]] = {}
+
+        self._names: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._values: Dict[str, Dict[str, Optional[str]]] = {}
+        self._free_rows: List[int] = []
+        self._alive = 0
+        self._lock = threading.RLock()
+
+        # Only one load runs at a time. While it does, these count how many
+        # agents it has fetched so far, out of how many.
+        self._sync_lock = threading.Lock()
+        self.loaded = 0
+        self.to_load = 0
+
+    @property
+    def is_loading(self) -> bool:
+        return self._sync_lock.locked()
+
+    # Building the table
+
+    def _set_bit(self, column: str, value: Optional[str], row: int) -> None:
+        index = self.columns[column]
+        index[value] = index.get(value, 0) | (1 << row)
+
+    def _clear_bit(self, column: str, value: Optional[str], row: int) -> None:
+        index = self.columns[column]
+        mask = index.get(value, 0) & ~(1 << row)
+
+        if mask:
+            index[value] = mask
+        else:
+            index.pop(value, None)
+
+    def _add_column(self, column: str) -> None:
+        # Every agent which existed before this column did is missing it.
+        self.columns[column] = {MISSING: self._alive} if self._alive else {}
+
+        for values in self._values.values():
+            values[column] = MISSING
+
+    def upsert(self, agent_name: str, settings: Dict[str, Any]) -> None:
+        """
+        Adds the agent, or replaces its settings if it's already present.
+        """
+        new_values = {key: _encode(value) for key, value in settings.items()}
+
+        with self._lock:
+            for column in new_values:
+                if column not in self.columns:
+                    self._add_column(column)
+
+            row = self._rows.get(agent_name)
+            is_new = row is None
+
+            if is_new:
+                row = self._free_rows.pop() if self._free_rows else len(self._names)
+
+                if row == len(self._names):
+                    self._names.append(agent_name)
+                else:
+                    self._names[row] = agent_name
+
+                self._rows[agent_name] = row
+                self._alive |= 1 << row
+
+            values = {column: new_values.get(column, MISSING) for column in self.columns}
+
+            for column, value in values.items():
+                if not is_new:
+                    old = self._values[agent_name][column]
+
+                    if old == value:
+                        continue
+
+                    self._clear_bit(column, old, row)
+
+                self._set_bit(column, value, row)
+
+            self._values[agent_name] = values
+
+    def remove(self, agent_name: str) -> None:
+        with self._lock:
+            row = self._rows.pop(agent_name, None)
+
+            if row is None:
+                return
+
+            for column, value in self._values.pop(agent_name).items():
+                self._clear_bit(column, value, row)
+
+            self._alive &= ~(1 << row)
+            self._names[row] = None
+            self._free_rows.append(row)
+
+    def sync(self, reload: bool = False) -> None:
+        """
+        Brings the table in line with the agent list: agents which no longer
+        exist are dropped, and new ones are fetched. With `reload`, the
+        configs of all agents are fetched from the backend again, rather than
+        from the cache.
+
+        Agents are added as they arrive, and subscribers of `TOPIC` are kept
+        informed, so the table can be shown while it's still filling up. If a
+        load is already running, this returns right away.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return
+
+        changes.notify(TOPIC)
+
+        try:
+            self._sync(reload)
+        finally:
+            self._sync_lock.release()
+            changes.notify(TOPIC)
+
+    def _sync(self, reload: bool) -> None:
+        if reload:
+            api.cache.invalidate("agents")
+            api.cache.invalidate_prefix(changes.AGENTCONFIG_PREFIX)
+
+        names = {agent["name"] for agent in api.get_agents()}
+
+        with self._lock:
+            for agent_name in set(self._rows) - names:
+                self.remove(agent_name)
+
+            if not reload:
+                names -= set(self._rows)
+
+        self.loaded = 0
+        self.to_load = len(names)
+        last_progress = time.monotonic()
+
+        def fetch(agent_name: str) -> None:
+            try:
+                config = api.get_agentconfig(agent_name)
+            except Exception as e:
+                logger.error(
+                    "Error fetching config of agent %s: %s",
+                    agent_name,
+                    e,
+                    extra={"event": "fetch_failed"},
+                )
+                return
+
+            self.upsert(agent_name, config.get("settings", {}))
+
+        with ThreadPoolExecutor(max_workers=LOAD_CONCURRENCY) as executor:
+            # Run each fetch in the caller's context, so the calls are
+            # attributed to whoever asked for them, if anybody.
+            futures = [
+                executor.submit(contextvars.copy_context().run, fetch, agent_name)
+                for agent_name in names
+            ]
+
+            for future in as_completed(futures):
+                # Consume the results, so errors aren't silently swallowed.
+                future.result()
+                self.loaded += 1
+
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    changes.notify(TOPIC)
+
+    def refresh_agent(self, agent_name: str) -> None:
+        """
+        Reloads a single agent, or removes it if it no longer exists. If the
+        agent can't be fetched, its row is left as it is.
+        """
+        try:
+            if all(agent.get("name") != agent_name for agent in api.get_agents()):
+                self.remove(agent_name)
+                return
+
+            config = api.get_agentconfig(agent_name)
+        except Exception as e:
+            logger.error(
+                "Error fetching config of agent %s: %s",
+                agent_name,
+                e,
+                extra={"event": "fetch_failed"},
+            )
+            return
+
+        self.upsert(agent_name, config.get("settings", {}))
+
+    # Queries. Results are bitmaps of rows, which can be combined with `&`,
+    # `|` and `~` before turning them into names with `names`.
+
+    @property
+    def all(self) -> int:
+        return self._alive
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def where(self, column: str, value: Any) -> int:
+        """
+        Returns the agents whose `column` equals `value`.
+        """
+        with self._lock:
+            return self.columns.get(column, {}).get(_encode(value), 0) & self._alive
+
+    def where_not(self, column: str, value: Any) -> int:
+        return self._alive & ~self.where(column, value)
+
+    def names(self, mask: int, limit: Optional[int] = None) -> List[str]:
+        with self._lock:
+            result = []
+
+            for row in _bits(mask & self._alive):
+                if limit is not None and len(result) >= limit:
+                    break
+
+                result.append(self._names[row])
+
+            return result
+
+    def group_by(self, column: str, mask: Optional[int] = None) -> Dict[Optional[str], int]:
+        """
+        Counts how many of the agents in `mask` (all, by default) have each
+        value of `column`.
+        """
+        mask = self._alive if mask is None else mask
+
+        with self._lock:
+            counts = {
+                value: (rows & mask).bit_count()
+                for value, rows in self.columns.get(column, {}).items()
+            }
+
+        return {value: count for value, count in counts.items() if count}
+
+    def diff(self, reference: Dict[str, Any], mask: Optional[int] = None) -> Dict[str, int]:
+        """
+        Compares the agents in `mask` (all, by default) against the
+        `reference` settings. Returns, for each setting, the agents whose value
+        differs. Settings without differences are left out.
+        """
+        mask = self._alive if mask is None else mask
+        result = {}
+
+        with self._lock:
+            for column, index in self.columns.items():
+                same = index.get(_encode(reference.get(column, MISSING)), 0)
+                different = mask & ~same
+
+                if different:
+                    result[column] = different
+
+        return result
+
+    def settings_of(self, agent_name: str) -> Dict[str, Any]:
+        """
+        Returns the agent's settings, decoded. Settings it doesn't have are
+        `None`.
+        """
+        with self._lock:
+            values = dict(self._values.get(agent_name, {}))
+
+        return {column: _decode(value) for column, value in values.items()}
+
+
+# Shared by all sessions of this worker.
+table = FleetTable()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import *  # type: ignore
+
+LOG_LEVEL = os.environ.get("AGIXT_LOG_LEVEL", "INFO").upper()
+
+# Records waiting to be written. If the writer can't keep up, new records are
+# dropped rather than slowing down the code that logs them.
+QUEUE_SIZE = 10_000
+
+# Per event, this many records are logged in each window. After that only
+# every `SAMPLE_EVERY`th one is, until the window is over.
+SAMPLING_BURST = 10
+SAMPLING_WINDOW = 60.0
+SAMPLE_EVERY = 100
+
+session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "agixt_log_session_id",
+    default=None,
+)
+call_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "agixt_log_call_id",
+    default=None,
+)
+
+# Attributes every `LogRecord` has. Anything else was passed via `extra` and
+# ends up in the JSON output.
+_STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a logger below the app's `agixt` logger. Pass `__name__`.
+    """
+    if name != "agixt" and not name.startswith("agixt."):
+        name = f"agixt.{name}"
+
+    return logging.getLogger(name)
+
+
+@contextmanager
+def session_scope(session: Any) -> Iterator[None]:
+    """
+    Tags all records logged within the block with the session's id.
+    """
+    token = session_id.set(f"{id(session):x}")
+
+    try:
+        yield
+    finally:
+        session_id.reset(token)
+
+
+@contextmanager
+def call_scope() -> Iterator[str]:
+    """
+    Tags all records logged within the block with a fresh call id, and yields
+    it.
+    """
+    new_id = uuid.uuid4().hex[:12]
+    token = call_id.set(new_id)
+
+    try:
+        yield new_id
+    finally:
+        call_id.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the correlation ids onto each record. This has to run in the
+    thread that logs the record, since that's where the context is.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.session_id = session_id.get()
+        record.call_id = call_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Limits how often the same event is logged, so a storm of identical errors
+    doesn't flood the output. Records count as the same event if they share
+    their `event`, their unformatted message, and the `endpoint` and
+    `resource` they are about (each passed via `extra`, if at all). The first
+    record to pass after some were dropped carries the number of dropped
+    records in `sampled_out`.
+    """
+
+    def __init__(
+        self,
+        burst: int = SAMPLING_BURST,
+        window: float = SAMPLING_WINDOW,
+        sample_every: int = SAMPLE_EVERY,
+    ) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample_every = sample_every
+
+        # key -> [window_start, count, dropped]
+        self._events: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (
+            record.name,
+            str(getattr(record, "event", "")),
+            str(record.msg),
+            str(getattr(record, "endpoint", "")),
+            str(getattr(record, "resource", "")),
+        )
+        now = time.monotonic()
+
+        with self._lock:
+            state = self._events.get(key)
+
+            if state is None or now - state[0] > self.window:
+                dropped = state[2] if state is not None else 0
+                state = self._events[key] = [now, 0, dropped]
+
+            state[1] += 1
+            count = state[1]
+
+            if count > self.burst and (count - self.burst) % self.sample_every != 0:
+                state[2] += 1
+                return False
+
+            dropped, state[2] = state[2], 0
+
+        if dropped:
+            record.sampled_out = dropped
+
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and value is not None:
+                entry[key] = value
+
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the background writer. Formatting happens over there;
+    only the message is rendered here, since its arguments might change once
+    the call returns.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup() -> None:
+    """
+    Routes everything logged below the `agixt` logger through a background
+    thread, which writes it to stderr as JSON lines. Stdout is left alone, so
+    command line tools can write their data there. Calling this more than
+    once has no effect.
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    records: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    handler = _BackgroundQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter())
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    logger = logging.getLogger("agixt")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
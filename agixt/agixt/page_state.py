@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+from typing import *  # type: ignore
+
+import rio
+
+from . import log
+
+logger = log.get_logger(__name__)
+
+# Bumped whenever the layout of a page's state changes. State written by an
+# older version is discarded rather than misread.
+VERSION = 1
+
+# Browsers only grant a few megabytes of local storage per site, so anything
+# bigger than this is not worth keeping.
+MAX_SIZE = 16 * 1024
+
+
+class PageState(rio.UserSettings):
+    """
+    Unsaved form state, kept in the browser so it survives reconnects and
+    switching between pages. Each page stores a single compact JSON document.
+    """
+
+    section_name = "agixt_page_state"
+
+    agent_management: str = ""
+
+
+def _settings_of(session: rio.Session) -> PageState:
+    try:
+        return session[PageState]
+    except KeyError:
+        settings = PageState()
+        session.attach(settings)
+        return settings
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def load(session: rio.Session, page: str) -> Dict[str, Any]:
+    """
+    Returns the state last stored for `page`, or an empty dictionary if there
+    is none or it can't be used.
+    """
+    encoded = getattr(_settings_of(session), page)
+
+    if not encoded:
+        return {}
+
+    try:
+        state = json.loads(encoded)
+    except ValueError:
+        return {}
+
+    if not isinstance(state, dict) or state.pop("v", None) != VERSION:
+        return {}
+
+    return state
+
+
+def store(session: rio.Session, page: str, state: Dict[str, Any]) -> None:
+    """
+    Remembers `state` for `page`. Empty values are left out, so a form nobody
+    has touched takes up almost no space.
+    """
+    encoded = json.dumps(
+        {"v": VERSION, **{key: value for key, value in state.items() if not _is_empty(value)}},
+        separators=(",", ":"),
+        sort_keys=True,
+    )
+
+    if len(encoded) > MAX_SIZE:
+        logger.warning(
+            "Not storing %d bytes of state for page %s",
+            len(encoded),
+            page,
+            extra={"event": "page_state_too_large"},
+        )
+        return
+
+    settings = _settings_of(session)
+
+    # Every assignment is sent to the browser, so skip the ones which don't
+    # change anything.
+    if getattr(settings, page) != encoded:
+        setattr(settings, page, encoded)
@@ -2,3 +2,6 @@ from .root_page import RootPage
 from .chain_management import ChainManagement
 from .agent_management import AgentManagement
 from .home_page import HomePage
+from .chat_page import ChatPage
+from .fleet_page import FleetPage
+from .diagnostics_page import DiagnosticsPage
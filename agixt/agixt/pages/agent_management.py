@@ -1,13 +1,25 @@
 from __future__ import annotations
-from agixtsdk import AGiXTSDK
+from dataclasses import field
 import rio
 from typing import *
 import asyncio
+import time
 
-# Initialize API Client
-base_uri = "http://localhost:7437"
-api_key = "your_agixt_api_key"
-ApiClient = AGiXTSDK(base_uri=base_uri, api_key=api_key)
+from .. import admission
+from .. import api
+from .. import changes
+from .. import log
+from .. import page_state
+from .. import save_queue
+from .. import components as comps
+
+logger = log.get_logger(__name__)
+
+# Where this page's state is stored, see `page_state`.
+PAGE = "agent_management"
+
+# How long to wait before trying to load data again, after it failed.
+RETRY_AFTER = 15.0
 
 # You can define your own functions for these based on your requirements.
 def prompt_selection(prompt, show_user_input):
@@ -23,11 +35,20 @@ def command_selection(prompt, show_user_input):
 
 class MultiSelect(rio.Component):
     options: List[Dict[str, Any]]
-    selected: Set[str] = set()
-    settings: Dict[str, Dict[str, str]] = {}
+    # Mutable defaults need factories, otherwise every instance (in every
+    # session) would share the same set and dictionary.
+    selected: Set[str] = field(default_factory=set)
+    settings: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+    # Called whenever the selection or a setting changes.
+    on_change: Optional[Callable[[], Any]] = None
 
     _is_open: bool = False
 
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
     async def _toggle_open(self) -> None:
         self._is_open = not self._is_open
         await self.force_refresh()  # Force refresh to update the popup state
@@ -40,11 +61,13 @@ class MultiSelect(rio.Component):
         else:
             self.selected.add(extension_name)
             self.settings[extension_name] = {setting: "" for setting in option["settings"]}
+        self._changed()
         await self.force_refresh()  # Force refresh to update the popup state
 
     def _update_setting(self, extension_name: str, setting: str, value: str) -> None:
         if extension_name in self.settings:
             self.settings[extension_name][setting] = value
+            self._changed()
 
     def build(self) -> rio.Component:
         grid = rio.Grid(row_spacing=0.4, column_spacing=0.5)  # Increased spacing for better readability
@@ -98,7 +121,7 @@ class MultiSelect(rio.Component):
                     grid.add(
                         rio.TextInput(
                             text=self.settings.get(option["name"], {}).get(setting, ""),
-                            on_change=lambda value, ext_name=option["name"], setting=setting: self._update_setting(ext_name, setting, value),
+                            on_change=lambda event, ext_name=option["name"], setting=setting: self._update_setting(ext_name, setting, event.text),
                         ),
                         row=row_index, column=1, width=2
                     )
@@ -147,10 +170,143 @@ class AgentManagement(rio.Component):
     Agent Management
     """
 
-    selected: set[str] = set()
+    selected: set[str] = field(default_factory=set)
+
+    # The form's working state. It's stored in the browser (see `page_state`)
+    # whenever it changes, so a reconnect or a visit to another page doesn't
+    # lose it.
+    action: str = "Create Agent"
+    agent_name: str = ""
+
+    # Settings the operator has changed, but not saved yet. Keyed like the
+    # agent's own settings, and applied on top of them.
+    edits: Dict[str, str] = field(default_factory=dict)
+
+    extensions: Set[str] = field(default_factory=set)
+    extension_settings: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+    # Data which was missing or expired when the page was built, and is
+    # being loaded in the background. Data which couldn't be loaded is
+    # remembered with the time of the attempt, so it's retried later.
+    _loading: Set[str] = field(default_factory=set)
+    _failed_at: Dict[str, float] = field(default_factory=dict)
+
+    @rio.event.on_populate
+    def _on_populate(self) -> None:
+        # Other operators may add, edit or delete agents while this page is
+        # open. The change watcher updates the shared cache, so all that's
+        # needed here is a rebuild.
+        changes.subscribe("agents", self._on_data_changed)
+        changes.subscribe("extension_settings", self._on_data_changed)
+
+        state = page_state.load(self.session, PAGE)
+        self.action = state.get("a", self.action)
+        self.agent_name = state.get("n", self.agent_name)
+        self.edits = state.get("e", {})
+        self.extensions = set(state.get("x", []))
+        self.extension_settings = state.get("s", {})
+
+    async def _on_data_changed(self, topic: str) -> None:
+        await self.force_refresh()
+
+    def _remember(self) -> None:
+        page_state.store(
+            self.session,
+            PAGE,
+            {
+                "a": self.action if self.action != "Create Agent" else None,
+                "n": self.agent_name,
+                "e": self.edits,
+                "x": sorted(self.extensions),
+                "s": self.extension_settings,
+            },
+        )
 
-    def render_provider_settings(self, provider_name, agent_settings, provider_settings):
-        settings = ApiClient.get_provider_settings(provider_name=provider_name)
+    def _discard_edits(self) -> None:
+        self.edits = {}
+        self.extensions = set()
+        self.extension_settings = {}
+
+    def _on_action_change(self, event: rio.DropdownChangeEvent) -> None:
+        self.action = event.value
+        self.agent_name = ""
+        self._discard_edits()
+        self._remember()
+
+    def _on_agent_selected(self, event: rio.DropdownChangeEvent) -> None:
+        # Unsaved edits belong to the previously selected agent.
+        self.agent_name = event.value
+        self._discard_edits()
+        self._remember()
+
+    def _on_agent_name_change(self, event: rio.TextInputChangeEvent) -> None:
+        self.agent_name = event.text
+        self._remember()
+
+    def _edit(self, key: str, value: str) -> None:
+        # Assign a new dictionary, so Rio notices the change and rebuilds.
+        self.edits = {**self.edits, key: value}
+        self._remember()
+
+    def _load_later(self, missing: List[Tuple[str, Callable[[], Any]]]) -> None:
+        # Data which is already loading, or failed to load a moment ago, isn't
+        # requested again. The page keeps working without it in the meantime.
+        now = time.monotonic()
+        missing = [
+            (description, loader)
+            for description, loader in missing
+            if description not in self._loading
+            and now - self._failed_at.get(description, -RETRY_AFTER) >= RETRY_AFTER
+        ]
+
+        if not missing:
+            return
+
+        self._loading.update(description for description, _ in missing)
+        asyncio.create_task(self._load(missing))
+
+    async def _load(self, missing: List[Tuple[str, Callable[[], Any]]]) -> None:
+        # One call at a time, so a reconnecting page doesn't hit the backend
+        # with a burst of requests.
+        any_failed = False
+
+        with admission.client(self.session):
+            for description, loader in missing:
+                try:
+                    await asyncio.to_thread(loader)
+
+                    # Reads fall back to expired data if the backend can't be
+                    # reached, so check whether anything new has arrived.
+                    with api.cached_only() as stale:
+                        loader()
+
+                    loaded = not stale
+                except Exception as e:
+                    logger.error("Error fetching %s: %s", description, e, extra={"event": "fetch_failed", "resource": description})
+                    loaded = False
+                finally:
+                    self._loading.discard(description)
+
+                if loaded:
+                    self._failed_at.pop(description, None)
+                else:
+                    self._failed_at[description] = time.monotonic()
+                    any_failed = True
+
+        await self.force_refresh()
+
+        # Rebuilding retries whatever is still missing, if the page is still
+        # there by then.
+        if any_failed:
+            await asyncio.sleep(RETRY_AFTER)
+            await self.force_refresh()
+
+    def render_provider_settings(self, provider_name, agent_settings, provider_settings, fetch):
+        # Placeholders like "None" aren't providers.
+        if not provider_name or provider_name == "None":
+            return provider_settings
+
+        settings = fetch(f"settings of provider {provider_name}", lambda: api.get_provider_settings(provider_name), {})
         for key, value in settings.items():
             if key in provider_settings:
                 settings[key] = provider_settings[key]
@@ -161,102 +317,144 @@ class AgentManagement(rio.Component):
         return provider_settings
 
     def build(self) -> rio.Component:
-        def log_error(message: str):
-            print(f"Error: {message}")  # Simple logging function for debugging
-
-        try:
-            agents = ApiClient.get_agents()
-        except Exception as e:
-            log_error(f"Error fetching agents: {e}")
-            agents = []
-
-        try:
-            providers = ApiClient.get_providers()
-        except Exception as e:
-            log_error(f"Error fetching providers: {e}")
-            providers = []
-
-        try:
-            extensions = ApiClient.get_extension_settings()
-        except Exception as e:
-            log_error(f"Error fetching extensions: {e}")
-            extensions = {}
+        # Attribute this page's backend calls to the session, so one busy user
+        # can't starve everybody else.
+        with admission.client(self.session):
+            return self._build()
+
+    def _build(self) -> rio.Component:
+        # The page is built from cached data only, so it shows up right away,
+        # even right after a reconnect. Whatever isn't cached yet, or has
+        # expired, is loaded in the background, and the page is rebuilt once
+        # it arrives.
+        missing: List[Tuple[str, Callable[[], Any]]] = []
+
+        def fetch(description: str, loader: Callable[[], Any], default: Any) -> Any:
+            try:
+                with api.cached_only() as stale:
+                    value = loader()
+
+                if stale:
+                    missing.append((description, loader))
+
+                return value
+            except api.NotCached:
+                missing.append((description, loader))
+                return default
+            except Exception as e:
+                logger.error("Error fetching %s: %s", description, e, extra={"event": "fetch_failed", "resource": description})
+                return default
+
+        def providers_for(service: str) -> List[str]:
+            return fetch(f"{service} providers", lambda: api.get_providers_by_service(service), []) or []
+
+        agents = fetch("agents", api.get_agents, [])
+        providers = fetch("providers", api.get_providers, [])
+        extensions = fetch("extensions", api.get_extension_settings, {})
 
         agent_action = rio.Dropdown(
             label="Action",
             options=["Create Agent", "Modify Agent", "Delete Agent"],
-            selected_value="Create Agent",
+            selected_value=self.action,
+            on_change=self._on_action_change,
         )
 
+        agent_names = [agent.get("name", "Unnamed agent") for agent in agents]
+
         if agent_action.selected_value == "Create Agent":
-            agent_name = rio.TextInput("", label="Enter the agent name:")
+            selected_agent = self.agent_name
+            agent_name = rio.TextInput(
+                self.agent_name,
+                label="Enter the agent name:",
+                on_change=self._on_agent_name_change,
+            )
         else:
-            agent_names = [agent.get("name", "Unnamed agent") for agent in agents]
+            # The remembered agent may have been deleted in the meantime.
+            selected_agent = (
+                self.agent_name
+                if self.agent_name in agent_names
+                else agent_names[0] if agent_names else ""
+            )
             agent_name = rio.Dropdown(
                 label="Select an agent:",
-                options=agent_names,
-                selected_value=agent_names[0] if agent_names else "",
+                options=agent_names if agent_names else ["No agents"],
+                selected_value=selected_agent,
+                on_change=self._on_agent_selected,
             )
 
         agent_config = {}
         agent_settings = {}
         agent_commands = {}
 
-        if agent_action.selected_value == "Modify Agent":
-            agent_config = ApiClient.get_agentconfig(agent_name.value)
+        if agent_action.selected_value == "Modify Agent" and selected_agent:
+            changes.subscribe(changes.agentconfig_topic(selected_agent), self._on_data_changed)
+            agent_config = fetch(f"config of agent {selected_agent}", lambda: api.get_agentconfig(selected_agent), {})
             agent_settings = agent_config.get("settings", {})
             agent_commands = agent_config.get("commands", {})
 
+        # Unsaved edits take precedence over the agent's settings.
+        def choice(key: str, options: List[str], default: str) -> str:
+            value = self.edits.get(key, agent_settings.get(key, default))
+            return value if value in options else default
+
+        def editor(key: str) -> Callable[[rio.DropdownChangeEvent], None]:
+            return lambda event: self._edit(key, event.value)
+
         provider_settings = {}
 
-        language_providers = ApiClient.get_providers_by_service("llm")
+        language_providers = providers_for("llm")
         selected_language_provider = rio.Dropdown(
             label="Select language provider:",
             options=language_providers if language_providers else ["No providers"],
-            selected_value=agent_settings.get("provider", language_providers[0] if language_providers else ""),
+            selected_value=choice("provider", language_providers, language_providers[0] if language_providers else ""),
+            on_change=editor("provider"),
         )
-        provider_settings = self.render_provider_settings(selected_language_provider.selected_value, agent_settings, provider_settings)
+        provider_settings = self.render_provider_settings(selected_language_provider.selected_value, agent_settings, provider_settings, fetch)
 
-        vision_providers = ["None"] + (ApiClient.get_providers_by_service("vision") or [])
+        vision_providers = ["None"] + providers_for("vision")
         selected_vision_provider = rio.Dropdown(
             label="Select vision provider:",
             options=vision_providers,
-            selected_value=agent_settings.get("vision_provider", "None"),
+            selected_value=choice("vision_provider", vision_providers, "None"),
+            on_change=editor("vision_provider"),
         )
         if selected_vision_provider.selected_value != "None":
-            provider_settings = self.render_provider_settings(selected_vision_provider.selected_value, agent_settings, provider_settings)
+            provider_settings = self.render_provider_settings(selected_vision_provider.selected_value, agent_settings, provider_settings, fetch)
 
-        tts_providers = ["None"] + (ApiClient.get_providers_by_service("tts") or [])
+        tts_providers = ["None"] + providers_for("tts")
         selected_tts_provider = rio.Dropdown(
             label="Select text to speech provider:",
             options=tts_providers,
-            selected_value=agent_settings.get("tts_provider", "None"),
+            selected_value=choice("tts_provider", tts_providers, "None"),
+            on_change=editor("tts_provider"),
         )
-        provider_settings = self.render_provider_settings(selected_tts_provider.selected_value, agent_settings, provider_settings)
+        provider_settings = self.render_provider_settings(selected_tts_provider.selected_value, agent_settings, provider_settings, fetch)
 
-        stt_providers = ApiClient.get_providers_by_service("transcription") or []
+        stt_providers = providers_for("transcription")
         selected_stt_provider = rio.Dropdown(
             label="Select speech to text provider:",
-            options=stt_providers,
-            selected_value=agent_settings.get("transcription_provider", stt_providers[0] if stt_providers else ""),
+            options=stt_providers if stt_providers else ["No providers"],
+            selected_value=choice("transcription_provider", stt_providers, stt_providers[0] if stt_providers else ""),
+            on_change=editor("transcription_provider"),
         )
-        provider_settings = self.render_provider_settings(selected_stt_provider.selected_value, agent_settings, provider_settings)
+        provider_settings = self.render_provider_settings(selected_stt_provider.selected_value, agent_settings, provider_settings, fetch)
 
-        image_providers = ["None"] + (ApiClient.get_providers_by_service("image") or [])
-        selected_img_provider = agent_settings.get("image_provider", "None")
+        image_providers = ["None"] + providers_for("image")
         selected_image_provider = rio.Dropdown(
             label="Select image generation provider:",
             options=image_providers,
-            selected_value=selected_img_provider,
+            selected_value=choice("image_provider", image_providers, "None"),
+            on_change=editor("image_provider"),
         )
         if selected_image_provider.selected_value != "None":
-            provider_settings = self.render_provider_settings(selected_image_provider.selected_value, agent_settings, provider_settings)
+            provider_settings = self.render_provider_settings(selected_image_provider.selected_value, agent_settings, provider_settings, fetch)
 
-        embedding_providers = ApiClient.get_providers_by_service("embeddings") or []
+        embedding_providers = providers_for("embeddings")
         selected_embedding_provider = rio.Dropdown(
             label="Select embeddings provider:",
-            options=embedding_providers,
-            selected_value=agent_settings.get("embeddings_provider", embedding_providers[0] if embedding_providers else ""),
+            options=embedding_providers if embedding_providers else ["No providers"],
+            selected_value=choice("embeddings_provider", embedding_providers, embedding_providers[0] if embedding_providers else ""),
+            on_change=editor("embeddings_provider"),
         )
 
         extension_options = [
@@ -268,22 +466,40 @@ class AgentManagement(rio.Component):
             for key, value in extensions.items()
         ]
 
+        # The selection lives on this page, so it's remembered along with the
+        # rest of the form.
         multi_select_extension = MultiSelect(
             options=extension_options,
+            selected=self.extensions,
+            settings=self.extension_settings,
+            on_change=self._remember,
         )
 
+        helper_agents = ["None"] + agent_names
         helper_agent = rio.Dropdown(
             label="Select helper agent (Optional):",
-            options=["None"] + [agent.get("name", "Unnamed agent") for agent in agents],
-            selected_value=agent_settings.get("helper_agent_name", "None"),
+            options=helper_agents,
+            selected_value=choice("helper_agent_name", helper_agents, "None"),
+            on_change=editor("helper_agent_name"),
         )
 
         chat_completions_mode = rio.Dropdown(
             label="Select chat completions mode:",
-            options=[("Prompt", "prompt"), ("Chain", "chain"), ("Command", "command")],
-            selected_value=agent_settings.get("mode", "prompt"),
+            options={"Prompt": "prompt", "Chain": "chain", "Command": "command"},
+            selected_value=choice("mode", ["prompt", "chain", "command"], "prompt"),
+            on_change=editor("mode"),
         )
 
+        def setting_inputs(settings: Dict[str, Any]) -> List[rio.TextInput]:
+            return [
+                rio.TextInput(
+                    label=key,
+                    text=self.edits.get(key, str(settings[key])),
+                    on_change=lambda event, key=key: self._edit(key, event.text),
+                )
+                for key in settings
+            ]
+
         prompt_settings_elements = []
         chain_settings_elements = []
         command_settings_elements = []
@@ -291,22 +507,26 @@ class AgentManagement(rio.Component):
 
         if chat_completions_mode.selected_value == "prompt":
             prompt_settings = prompt_selection(prompt=agent_settings, show_user_input=False)
-            prompt_settings_elements = [rio.TextInput(label=key, default=str(prompt_settings[key])) for key in prompt_settings]
+            prompt_settings_elements = setting_inputs(prompt_settings)
 
         if chat_completions_mode.selected_value == "chain":
             chain_settings = chain_selection(prompt=agent_settings, show_user_input=False)
-            chain_settings_elements = [rio.TextInput(label=key, default=str(chain_settings[key])) for key in chain_settings]
+            chain_settings_elements = setting_inputs(chain_settings)
 
         if chat_completions_mode.selected_value == "command":
             command_settings = command_selection(prompt=agent_settings, show_user_input=False)
-            command_settings_elements = [rio.TextInput(label=key, default=str(command_settings[key])) for key in command_settings]
+            command_settings_elements = setting_inputs(command_settings)
             if command_settings and "command_args" in command_settings:
+                command_variables = [""] + list(command_settings["command_args"].keys())
                 command_variable = rio.Dropdown(
                     label="Select Command Variable",
-                    options=[""] + list(command_settings["command_args"].keys()),
-                    selected_value=agent_settings.get("command_variable", ""),
+                    options=command_variables,
+                    selected_value=choice("command_variable", command_variables, ""),
+                    on_change=editor("command_variable"),
                 )
 
+        self._load_later(missing)
+
         def save_agent_settings():
             settings = {
                 "provider": selected_language_provider.selected_value,
@@ -335,16 +555,25 @@ class AgentManagement(rio.Component):
             selected_commands = []  # Define the variable and assign an empty list
             commands = {command: True for command in selected_commands}
 
+            # Saves are queued and sent in the background, so the page stays
+            # responsive even if the backend is slow. Their progress is shown
+            # by the `SaveStatusList` at the bottom of the page.
             if agent_action.selected_value == "Create Agent":
-                response = ApiClient.add_agent(agent_name=agent_name.text, settings=settings, commands=commands)
-                print(f"Agent '{agent_name.text}' created.")
+                save = save_queue.PendingSave(agent_name=selected_agent, action="create", settings=settings, commands=commands)
             elif agent_action.selected_value == "Modify Agent":
-                response = ApiClient.update_agent_settings(agent_name=agent_name.selected_value, settings=settings)
-                response = ApiClient.update_agent_commands(agent_name=agent_name.selected_value, commands=commands)
-                print(f"Agent '{agent_name.selected_value}' updated.")
+                save = save_queue.PendingSave(agent_name=selected_agent, action="update", settings=settings, commands=commands)
             elif agent_action.selected_value == "Delete Agent":
-                response = ApiClient.delete_agent(agent_name.selected_value)
-                print(f"Agent '{agent_name.selected_value}' deleted.")
+                save = save_queue.PendingSave(agent_name=selected_agent, action="delete")
+            else:
+                return
+
+            save_queue.queue.submit(save)
+            logger.info("Agent '%s' queued for %s.", save.agent_name, save.action, extra={"event": "save_queued"})
+
+            # The edits are on their way to the backend now, and the cache
+            # already reflects them.
+            self._discard_edits()
+            self._remember()
 
         return rio.Column(
             rio.Markdown(
@@ -356,6 +585,7 @@ class AgentManagement(rio.Component):
                 align_x=0.5,
                 align_y=0,
             ),
+            *([rio.Text("Loading…", style="dim")] if self._loading else []),
             agent_action,
             agent_name,
             rio.Markdown("## Select Providers"),
@@ -396,4 +626,5 @@ class AgentManagement(rio.Component):
                 "Save Agent Settings",
                 on_press=lambda: save_agent_settings(),
             ),
+            comps.SaveStatusList(),
         )
@@ -1,13 +1,43 @@
+import asyncio
+import time
+from dataclasses import field
+
 import rio
 
+from .. import admission
+from .. import api
+from .. import changes
+from .. import log
+
+logger = log.get_logger(__name__)
+
+# How long to wait before trying to load the chain list again, after it failed.
+RETRY_AFTER = 15.0
+
 class ChainManagement(rio.Component):
     chain_name: str = "Example Chain"
-    steps: list = [
+    # Use a factory, so every session gets its own list instead of all of them
+    # editing the same one.
+    steps: list = field(default_factory=lambda: [
         {'agent_name': 'Agent 1', 'prompt_type': 'Chain'},
         {'agent_name': 'Agent 2', 'prompt_type': 'Prompt'}
-    ]
+    ])
     selected_prompt_type: str = "Chain"
     selected_step_index: int = 0
+    selected_chain: str = ""
+
+    # Data which is being loaded in the background, and when loading data
+    # last failed, so it's retried later.
+    _loading: set = field(default_factory=set)
+    _failed_at: dict = field(default_factory=dict)
+
+    # Keep the chain list current while other operators add or remove chains.
+    @rio.event.on_populate
+    def _subscribe_to_changes(self):
+        changes.subscribe("chains", self._on_chains_changed)
+
+    async def _on_chains_changed(self, topic):
+        await self.force_refresh()
 
     def build(self):
         return rio.Column(
@@ -38,9 +68,72 @@ class ChainManagement(rio.Component):
                 on_change=self.on_chain_name_change,
                 width=10  # Adjust the width of the text input if needed
             ),
-
+            rio.Dropdown(
+                options=self.get_chain_names() or [""],
+                label="Saved Chains",
+                selected_value=self.selected_chain,
+                on_change=self.on_selected_chain_change
+            ),
         )
 
+    def get_chain_names(self):
+        # This runs during `build`, on the event loop, so it only looks at the
+        # cache. If the list isn't cached yet, or has expired, it's loaded in
+        # the background and the page is rebuilt once it arrives.
+        try:
+            with api.cached_only() as stale:
+                chains = list(api.get_chains() or [])
+        except api.NotCached:
+            stale, chains = ["chains"], []
+        except Exception as e:
+            logger.error("Error fetching chains: %s", e, extra={"event": "fetch_failed", "resource": "chains"})
+            return []
+
+        if stale:
+            self._load_chains_later()
+
+        return chains
+
+    def _load_chains_later(self):
+        # Don't ask again while a load is running, or right after one failed.
+        if "chains" in self._loading or time.monotonic() - self._failed_at.get("chains", -RETRY_AFTER) < RETRY_AFTER:
+            return
+
+        self._loading.add("chains")
+        asyncio.create_task(self._load_chains())
+
+    async def _load_chains(self):
+        try:
+            with admission.client(self.session):
+                await asyncio.to_thread(api.get_chains)
+
+            # Reads fall back to expired data if the backend can't be reached,
+            # so check whether anything new has arrived.
+            with api.cached_only() as stale:
+                api.get_chains()
+
+            loaded = not stale
+        except Exception as e:
+            logger.error("Error fetching chains: %s", e, extra={"event": "fetch_failed", "resource": "chains"})
+            loaded = False
+        finally:
+            self._loading.discard("chains")
+
+        if loaded:
+            self._failed_at.pop("chains", None)
+        else:
+            self._failed_at["chains"] = time.monotonic()
+
+        await self.force_refresh()
+
+        # Rebuilding retries the load, if the page is still there by then.
+        if not loaded:
+            await asyncio.sleep(RETRY_AFTER)
+            await self.force_refresh()
+
+    def on_selected_chain_change(self, event):
+        self.selected_chain = event.value
+
     
     def on_save(self):
         if self.validate_chain():
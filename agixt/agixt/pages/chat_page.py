@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import KW_ONLY, field
+from typing import *  # type: ignore
+
+import rio
+
+from .. import admission
+from .. import api
+from .. import chat
+from .. import log
+from .. import components as comps
+from ..components.chat_message import ChatEntry
+
+logger = log.get_logger(__name__)
+
+# At most this many messages are rendered at a time. Older ones are paged in
+# on request, replacing the newer ones, so long conversations stay cheap to
+# display no matter how far back the user scrolls.
+PAGE_SIZE = 50
+
+# Only the most recent messages are kept in the session. Older ones are still
+# part of the conversation on the backend, but not shown on this page anymore.
+MAX_HISTORY = 500
+
+# How long to wait before trying to load the agent list again, after it
+# failed.
+RETRY_AFTER = 15.0
+
+
+class ChatPage(rio.Component):
+    """
+    Lets the user talk to an agent. Responses are streamed in as they are
+    generated.
+    """
+
+    agent_name: str = ""
+    conversation_name: str = "Rio UI"
+    draft: str = ""
+    messages: List[ChatEntry] = field(default_factory=list)
+
+    # How many of the newest messages the rendered window is scrolled past.
+    # Zero shows the latest messages.
+    offset: int = 0
+
+    # Data which is being loaded in the background, and when loading data
+    # last failed, so it's retried later.
+    _loading: Set[str] = field(default_factory=set)
+    _failed_at: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def is_streaming(self) -> bool:
+        return bool(self.messages) and self.messages[-1].is_streaming
+
+    async def _send(self, agent_name: str) -> None:
+        user_input = self.draft.strip()
+
+        if not user_input or not agent_name or self.is_streaming:
+            return
+
+        stream = chat.TokenStream()
+        self.messages = [
+            *self.messages,
+            ChatEntry(role="user", text=user_input),
+            ChatEntry(role="agent", stream=stream),
+        ][-MAX_HISTORY:]
+        self.draft = ""
+
+        # Show the new message, and the response as it comes in.
+        self.offset = 0
+
+        # The message component renders the stream on its own, so this page
+        # only needs to rebuild once the response is complete, to re-enable
+        # the input.
+        await chat.stream_completion(stream, agent_name, user_input, self.conversation_name)
+        await self.force_refresh()
+
+    # Nobody will see the rest of a response once the page is gone, so stop
+    # receiving it.
+    @rio.event.on_unmount
+    def _on_unmount(self) -> None:
+        for entry in self.messages:
+            if entry.stream is not None:
+                entry.stream.cancel()
+
+    def _scroll(self, offset: int) -> None:
+        self.offset = min(max(offset, 0), max(len(self.messages) - PAGE_SIZE, 0))
+
+    def _on_agent_selected(self, event: rio.DropdownChangeEvent) -> None:
+        self.agent_name = event.value
+
+    def _agent_names(self) -> List[str]:
+        # This runs during `build`, on the event loop, so it only looks at the
+        # cache. If the list isn't cached yet, or has expired, it's loaded in
+        # the background and the page is rebuilt once it arrives.
+        try:
+            with api.cached_only() as stale:
+                agents = api.get_agents()
+        except api.NotCached:
+            stale, agents = ["agents"], []
+        except Exception as e:
+            logger.error("Error fetching agents: %s", e, extra={"event": "fetch_failed", "resource": "agents"})
+            return []
+
+        if stale:
+            self._load_agents_later()
+
+        return [agent.get("name", "Unnamed agent") for agent in agents]
+
+    def _load_agents_later(self) -> None:
+        # Don't ask again while a load is running, or right after one failed.
+        if "agents" in self._loading or time.monotonic() - self._failed_at.get("agents", -RETRY_AFTER) < RETRY_AFTER:
+            return
+
+        self._loading.add("agents")
+        asyncio.create_task(self._load_agents())
+
+    async def _load_agents(self) -> None:
+        try:
+            with admission.client(self.session):
+                await asyncio.to_thread(api.get_agents)
+
+            # Reads fall back to expired data if the backend can't be reached,
+            # so check whether anything new has arrived.
+            with api.cached_only() as stale:
+                api.get_agents()
+
+            loaded = not stale
+        except Exception as e:
+            logger.error("Error fetching agents: %s", e, extra={"event": "fetch_failed", "resource": "agents"})
+            loaded = False
+        finally:
+            self._loading.discard("agents")
+
+        if loaded:
+            self._failed_at.pop("agents", None)
+        else:
+            self._failed_at["agents"] = time.monotonic()
+
+        await self.force_refresh()
+
+        # Rebuilding retries the load, if the page is still there by then.
+        if not loaded:
+            await asyncio.sleep(RETRY_AFTER)
+            await self.force_refresh()
+
+    def build(self) -> rio.Component:
+        agent_names = self._agent_names()
+
+        # Until an agent has been picked, talk to the first one. The picked
+        # agent may also have been deleted in the meantime.
+        selected_agent = (
+            self.agent_name
+            if self.agent_name in agent_names
+            else agent_names[0] if agent_names else ""
+        )
+
+        end = len(self.messages) - self.offset
+        start = max(end - PAGE_SIZE, 0)
+        history: List[rio.Component] = []
+
+        if start:
+            history.append(
+                rio.Button(
+                    f"Show earlier messages ({start} more)",
+                    on_press=lambda: self._scroll(self.offset + PAGE_SIZE),
+                    style="plain",
+                )
+            )
+
+        history.extend(
+            comps.ChatMessage(entry, key=f"message-{entry.id}")
+            for entry in self.messages[start:end]
+        )
+
+        if self.offset:
+            history.append(
+                rio.Row(
+                    rio.Button(
+                        f"Show later messages ({self.offset} more)",
+                        on_press=lambda: self._scroll(self.offset - PAGE_SIZE),
+                        style="plain",
+                    ),
+                    rio.Button(
+                        "Back to the latest",
+                        on_press=lambda: self._scroll(0),
+                        style="plain",
+                    ),
+                    spacing=1,
+                )
+            )
+
+        return rio.Column(
+            rio.Markdown(
+                """
+# Chat
+                """,
+                width=60,
+                margin_bottom=4,
+                align_x=0.5,
+                align_y=0,
+            ),
+            rio.Row(
+                rio.Dropdown(
+                    label="Agent",
+                    options=agent_names if agent_names else ["No agents"],
+                    selected_value=selected_agent,
+                    on_change=self._on_agent_selected,
+                ),
+                rio.TextInput(
+                    label="Conversation",
+                    text=self.bind().conversation_name,
+                ),
+                spacing=1,
+            ),
+            rio.ScrollContainer(
+                rio.Column(*history, spacing=1, margin=1, align_y=1),
+                scroll_x="never",
+                height=40,
+            ),
+            rio.Row(
+                rio.TextInput(
+                    label="Message",
+                    text=self.bind().draft,
+                    on_confirm=lambda _: asyncio.create_task(self._send(selected_agent)),
+                    is_sensitive=not self.is_streaming,
+                    width="grow",
+                ),
+                rio.Button(
+                    "Send",
+                    icon="material/send",
+                    on_press=lambda: asyncio.create_task(self._send(selected_agent)),
+                    is_sensitive=not self.is_streaming,
+                ),
+                spacing=1,
+            ),
+            spacing=1,
+            width=60,
+            align_x=0.5,
+        )
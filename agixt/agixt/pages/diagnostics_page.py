@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from dataclasses import KW_ONLY, field
+from typing import *  # type: ignore
+
+import rio
+
+from .. import diagnostics
+from .. import components as comps
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+class DiagnosticsPage(rio.Component):
+    """
+    Reports memory usage per session and per component class, and flags
+    possible leaks. Only available if `AGIXT_MEMORY_DIAGNOSTICS` is set.
+    """
+
+    # Incremented to take a new measurement.
+    generation: int = 0
+
+    def _refresh(self) -> None:
+        self.generation += 1
+
+    def build(self) -> rio.Component:
+        report = diagnostics.report()
+
+        sessions = "\n".join(
+            f"| {session.session_id:x} | {session.component_count} | {_format_bytes(session.retained_bytes)} |"
+            for session in sorted(report.sessions, key=lambda s: s.retained_bytes, reverse=True)
+        )
+        classes = "\n".join(
+            f"| {class_name} | {_format_bytes(size)} |"
+            for class_name, size in sorted(report.bytes_by_class.items(), key=lambda item: item[1], reverse=True)
+        )
+        growing = "\n".join(f"- ⚠️ `{class_name}`" for class_name in report.growing_classes) or "None"
+        shared = "\n".join(
+            f"- `{class_name}.{attribute}`" for class_name, attribute in report.shared_attributes
+        ) or "None"
+        allocations = "\n".join(report.top_allocations) or "tracemalloc is not running"
+
+        return rio.Column(
+            rio.Markdown(
+                f"""
+# Memory Diagnostics
+
+## Sessions ({len(report.sessions)} live)
+
+| Session | Components | Retained |
+| --- | --- | --- |
+{sessions}
+
+## Component Classes
+
+| Class | Retained |
+| --- | --- |
+{classes}
+
+## Growing Without Bound
+
+{growing}
+
+## Mutable State Shared Between Sessions
+
+{shared}
+
+## Top Allocation Sites Since Last Refresh
+
+```
+{allocations}
+```
+                """,
+            ),
+            rio.Button(
+                "Refresh",
+                icon="material/refresh",
+                on_press=self._refresh,
+            ),
+            spacing=2,
+            width=80,
+            align_x=0.5,
+        )
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import KW_ONLY, field
+from typing import *  # type: ignore
+
+import rio
+
+from .. import changes
+from .. import fleet
+from .. import log
+from .. import components as comps
+
+logger = log.get_logger(__name__)
+
+# At most this many agent names are listed per result. The counts are always
+# complete.
+NAME_LIMIT = 20
+
+NO_COLUMN = "(none)"
+
+
+def _format_value(value: Optional[str]) -> str:
+    # Values are JSON-encoded, so strings show up in quotes and can be told
+    # apart from numbers.
+    return "*(not set)*" if value is None else f"`{value}`"
+
+
+def _filter_values(text: str) -> List[Any]:
+    """
+    Returns the setting values an entered filter value stands for: the text
+    itself, and whatever it means as JSON (e.g. a number). An empty filter
+    matches agents without the setting.
+    """
+    if not text:
+        return [None]
+
+    try:
+        return [text, json.loads(text)]
+    except ValueError:
+        return [text]
+
+
+class FleetPage(rio.Component):
+    """
+    Compares the settings of all agents: filter them by a setting, count them
+    by the values of a setting, and find the agents which differ from a
+    reference agent.
+    """
+
+    filter_column: str = NO_COLUMN
+    filter_value: str = ""
+    group_column: str = NO_COLUMN
+    reference_agent: str = ""
+
+    @rio.event.on_populate
+    async def _on_populate(self) -> None:
+        changes.subscribe("agents", self._on_agents_changed)
+        changes.subscribe(changes.ANY_AGENTCONFIG, self._on_agentconfig_changed)
+        changes.subscribe(fleet.TOPIC, self._on_table_changed)
+
+        if not len(fleet.table):
+            await self._load()
+
+    async def _load(self, reload: bool = False) -> None:
+        # The table is shared by every session of this worker, so loading it
+        # isn't charged to the budget of whichever session happens to ask
+        # first. `fleet.LOAD_CONCURRENCY` bounds it instead, and only one load
+        # runs at a time.
+        try:
+            await asyncio.to_thread(fleet.table.sync, reload)
+        except Exception as e:
+            logger.error("Error loading agents: %s", e, extra={"event": "fetch_failed", "resource": "agents"})
+
+    async def _on_agents_changed(self, topic: str) -> None:
+        await self._load()
+
+    async def _on_agentconfig_changed(self, topic: str) -> None:
+        agent_name = topic[len(changes.AGENTCONFIG_PREFIX):]
+        await asyncio.to_thread(fleet.table.refresh_agent, agent_name)
+        await self.force_refresh()
+
+    async def _on_table_changed(self, topic: str) -> None:
+        await self.force_refresh()
+
+    def _names(self, mask: int) -> str:
+        names = fleet.table.names(mask, limit=NAME_LIMIT)
+        more = mask.bit_count() - len(names)
+        listed = ", ".join(names)
+
+        return f"{listed}, … and {more} more" if more > 0 else listed
+
+    def _build_results(self) -> str:
+        table = fleet.table
+        selection = table.all
+
+        if self.filter_column != NO_COLUMN:
+            matches = 0
+
+            for value in _filter_values(self.filter_value):
+                matches |= table.where(self.filter_column, value)
+
+            selection &= matches
+
+        sections = [
+            f"**{selection.bit_count()}** of {len(table)} agents selected: {self._names(selection)}"
+        ]
+
+        if self.group_column != NO_COLUMN:
+            counts = sorted(
+                table.group_by(self.group_column, selection).items(),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            rows = "\n".join(f"| {_format_value(value)} | {count} |" for value, count in counts)
+            sections.append(f"## By `{self.group_column}`\n\n| Value | Agents |\n| --- | --- |\n{rows}")
+
+        if self.reference_agent:
+            reference = table.settings_of(self.reference_agent)
+            differences = table.diff(reference, selection)
+            encoded = {
+                column: None if value is None else json.dumps(value, sort_keys=True)
+                for column, value in reference.items()
+            }
+            rows = "\n".join(
+                f"| `{column}` | {_format_value(encoded.get(column))} | {mask.bit_count()} | {self._names(mask)} |"
+                for column, mask in sorted(differences.items(), key=lambda item: item[1].bit_count(), reverse=True)
+            )
+            sections.append(
+                f"## Differences from `{self.reference_agent}`\n\n"
+                f"| Setting | Reference | Agents | Differing agents |\n| --- | --- | --- | --- |\n{rows}"
+                if rows
+                else f"## Differences from `{self.reference_agent}`\n\nAll selected agents match."
+            )
+
+        return "\n\n".join(sections)
+
+    def _build_status(self) -> rio.Component:
+        table = fleet.table
+
+        if not table.is_loading:
+            return rio.Spacer(height=0)
+
+        # Results are shown while the table fills up, and grow as it does.
+        return rio.Text(f"Loading agents… {table.loaded} of {table.to_load}", style="dim")
+
+    def build(self) -> rio.Component:
+        columns = [NO_COLUMN, *sorted(fleet.table.columns)]
+        agent_names = sorted(fleet.table.names(fleet.table.all))
+
+        return rio.Column(
+            rio.Markdown(
+                """
+# Agent Fleet
+                """,
+                width=60,
+                margin_bottom=4,
+                align_x=0.5,
+                align_y=0,
+            ),
+            rio.Row(
+                rio.Dropdown(
+                    label="Filter by setting",
+                    options=columns,
+                    selected_value=self.bind().filter_column,
+                ),
+                rio.TextInput(
+                    label="Value (empty means not set)",
+                    text=self.bind().filter_value,
+                ),
+                rio.Dropdown(
+                    label="Group by setting",
+                    options=columns,
+                    selected_value=self.bind().group_column,
+                ),
+                rio.Dropdown(
+                    label="Compare against agent",
+                    options=["", *agent_names],
+                    selected_value=self.bind().reference_agent,
+                ),
+                spacing=1,
+            ),
+            rio.Button(
+                "Reload all agents",
+                icon="material/refresh",
+                on_press=lambda: asyncio.create_task(self._load(reload=True)),
+                is_sensitive=not fleet.table.is_loading,
+            ),
+            self._build_status(),
+            rio.Markdown(self._build_results()),
+            spacing=2,
+            width=80,
+            align_x=0.5,
+        )
@@ -5,6 +5,7 @@ from typing import *  # type: ignore
 
 import rio
 
+from .. import assets
 from .. import components as comps
 
 class HomePage(rio.Component):
@@ -14,8 +15,10 @@ class HomePage(rio.Component):
 
     def build(self) -> rio.Component:
         return rio.Column(
-                        rio.Html(f"""
-                <img src="https://josh-xt.github.io/AGiXT/images/AGiXT-gradient-light.svg" width="200">
+            # The logo is shipped with the app and always inlined, so the
+            # first paint doesn't depend on any other request.
+            rio.Html(f"""
+                <img src="{assets.url('AGiXT-gradient-light.svg')}" alt="AGiXT" width="200">
             """),
             rio.Text("Welcome to AGiXT", style="heading1"),
             rio.Text("Your AI-powered assistant for streamlining tasks and workflows"),
@@ -6,6 +6,7 @@ from typing import *  # type: ignore
 import rio
 
 from .. import components as comps
+from .. import diagnostics
 
 class RootPage(rio.Component):
     """
@@ -21,6 +22,12 @@ class RootPage(rio.Component):
     with the content of the current page in between.
     """
 
+    # The root page exists exactly once per session, which makes it the right
+    # place to register the session for memory diagnostics.
+    @rio.event.on_populate
+    def _track_session(self) -> None:
+        diagnostics.track_session(self.session)
+
     def build(self) -> rio.Component:
         return rio.Column(
             # The navbar contains a `rio.Overlay`, so it will always be on top
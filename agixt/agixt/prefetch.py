@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import *  # type: ignore
+
+from . import api
+
+# The SDK is blocking, so warm the cache from a few background threads. Loads
+# are deduplicated by the cache itself, so prefetching the same page many times
+# in a row is cheap.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agixt-prefetch")
+
+
+def _agent_management_loaders() -> List[Callable[[], Any]]:
+    return [
+        api.get_agents,
+        api.get_providers,
+        api.get_extension_settings,
+        *[
+            lambda service=service: api.get_providers_by_service(service)
+            for service in api.PROVIDER_SERVICES
+        ],
+    ]
+
+
+def _chain_management_loaders() -> List[Callable[[], Any]]:
+    return [
+        api.get_chains,
+        api.get_agents,
+    ]
+
+
+def _chat_loaders() -> List[Callable[[], Any]]:
+    return [
+        api.get_agents,
+    ]
+
+
+def _fleet_loaders() -> List[Callable[[], Any]]:
+    # The fleet table itself is filled by the page, since that's many calls.
+    return [
+        api.get_agents,
+    ]
+
+
+# Which data each page needs, keyed by the page's URL segment.
+PAGE_LOADERS: Dict[str, Callable[[], List[Callable[[], Any]]]] = {
+    "agent_management": _agent_management_loaders,
+    "chain_management": _chain_management_loaders,
+    "chat": _chat_loaders,
+    "fleet": _fleet_loaders,
+}
+
+
+def _run_quietly(loader: Callable[[], Any]) -> None:
+    # Prefetching is best effort. If it fails, the page will simply fetch (and
+    # report the error) when it's built.
+    try:
+        loader()
+    except Exception:
+        pass
+
+
+def prefetch(page_url: str) -> None:
+    """
+    Starts loading the data for the page at `page_url` into the shared cache,
+    without waiting for it. Data which is already cached is not fetched again.
+    """
+    page_url = page_url.strip("/")
+
+    try:
+        loaders = PAGE_LOADERS[page_url]()
+    except KeyError:
+        return
+
+    # Run the loaders in the caller's context, so their backend calls count
+    # against the budget of the session that triggered the prefetch.
+    for loader in loaders:
+        _executor.submit(contextvars.copy_context().run, _run_quietly, loader)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import *  # type: ignore
+
+from . import log
+
+T = TypeVar("T")
+
+logger = log.get_logger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the backend while the circuit breaker considers
+    it unhealthy.
+    """
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    # How long to wait for a response, in seconds.
+    timeout: float
+
+    # If set, a second, identical request is sent when the first one hasn't
+    # answered after this many seconds, and whichever finishes first wins. Only
+    # use this for idempotent reads.
+    hedge_after: Optional[float] = None
+
+
+# Hedged reads trade a bit of extra backend load for lower tail latency. They
+# are opt-in: set `AGIXT_HEDGE_AFTER` to the delay (in seconds) after which a
+# duplicate request is sent.
+_hedge_after = float(os.environ.get("AGIXT_HEDGE_AFTER", "0")) or None
+
+DEFAULT_POLICY = EndpointPolicy(timeout=10)
+
+POLICIES: Dict[str, EndpointPolicy] = {
+    "get_agents": EndpointPolicy(timeout=5),
+    "get_agentconfig": EndpointPolicy(timeout=5),
+    "get_chains": EndpointPolicy(timeout=5),
+    "get_providers": EndpointPolicy(timeout=5, hedge_after=_hedge_after),
+    "get_providers_by_service": EndpointPolicy(timeout=3, hedge_after=_hedge_after),
+    "get_provider_settings": EndpointPolicy(timeout=3, hedge_after=_hedge_after),
+    "get_extension_settings": EndpointPolicy(timeout=5, hedge_after=_hedge_after),
+    # Writes are never hedged, since they aren't idempotent.
+    "add_agent": EndpointPolicy(timeout=15),
+    "update_agent_settings": EndpointPolicy(timeout=15),
+    "update_agent_commands": EndpointPolicy(timeout=15),
+    "delete_agent": EndpointPolicy(timeout=15),
+    "get_chain": EndpointPolicy(timeout=5),
+    "import_chain": EndpointPolicy(timeout=30),
+}
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive backend failures. After `failure_threshold` of them
+    the circuit opens and calls fail immediately. Once `reset_timeout`
+    seconds have passed, a single trial call is let through; if it succeeds
+    the circuit closes again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            if self._trial_in_progress:
+                return False
+
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_inconclusive(self) -> None:
+        """
+        Records a call which failed for reasons unrelated to the backend's
+        health. It neither resets nor adds to the failure count, but frees
+        the slot of a trial call, so another one can be made later.
+        """
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            was_open = self._opened_at is not None
+
+            if was_open or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+        if not was_open and self._opened_at is not None:
+            logger.warning(
+                "Circuit breaker opened after %d consecutive failures",
+                self._failures,
+                extra={"event": "circuit_opened"},
+            )
+
+
+# All endpoints talk to the same AGiXT server, so they share one breaker.
+breaker = CircuitBreaker()
+
+# The SDK blocks, so calls run on worker threads which can be abandoned when
+# they time out. Requests which are still stuck on the backend keep their
+# thread, which is why this pool is bounded.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="agixt-api")
+
+
+def _is_backend_failure(err: BaseException) -> bool:
+    # Timeouts and connection problems say something about the backend's
+    # health. Other errors (bad input, missing agents, ...) don't. The SDK
+    # wraps whatever went wrong in a plain `Exception`, so look at the errors
+    # it was raised from as well. (`requests` errors are `OSError`s.)
+    seen: Set[int] = set()
+    current: Optional[BaseException] = err
+
+    while current is not None and id(current) not in seen:
+        if isinstance(current, (TimeoutError, OSError)):
+            return True
+
+        seen.add(id(current))
+        current = current.__cause__ or current.__context__
+
+    return False
+
+
+def call(endpoint: str, fn: Callable[[], T]) -> T:
+    """
+    Runs `fn` under the timeout and hedging policy configured for `endpoint`,
+    guarded by the circuit breaker.
+
+    Raises `CircuitOpenError` without calling `fn` while the breaker is open,
+    and `TimeoutError` if no response arrives in time.
+    """
+    # Every call gets its own id, so its log records can be told apart from
+    # those of concurrent calls.
+    with log.call_scope():
+        return _call(endpoint, fn)
+
+
+def _call(endpoint: str, fn: Callable[[], T]) -> T:
+    policy = POLICIES.get(endpoint, DEFAULT_POLICY)
+
+    if not breaker.allow():
+        logger.debug("Not calling `%s`, circuit is open", endpoint, extra={"event": "circuit_rejected", "endpoint": endpoint})
+        raise CircuitOpenError(f"AGiXT is unavailable, not calling `{endpoint}`")
+
+    deadline = time.monotonic() + policy.timeout
+    pending: Set[Future] = {_executor.submit(fn)}
+    hedged = policy.hedge_after is None
+    error: Optional[BaseException] = None
+
+    while pending:
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            break
+
+        wait_for = remaining if hedged else min(remaining, policy.hedge_after)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            err = future.exception()
+
+            if err is None:
+                breaker.record_success()
+                return future.result()
+
+            error = err
+
+        if not hedged and not done:
+            pending.add(_executor.submit(fn))
+            hedged = True
+
+    if pending:
+        error = TimeoutError(f"`{endpoint}` did not respond within {policy.timeout}s")
+
+    assert error is not None
+
+    logger.warning(
+        "Call to `%s` failed: %s",
+        endpoint,
+        error,
+        extra={"event": "backend_call_failed", "endpoint": endpoint},
+    )
+
+    if _is_backend_failure(error):
+        breaker.record_failure()
+    else:
+        breaker.record_inconclusive()
+
+    raise error
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field, replace
+from typing import *  # type: ignore
+
+from . import api
+from . import changes
+from . import log
+from . import resilience
+from .api import ApiClient
+
+# Components showing save progress subscribe to this topic.
+STATUS_TOPIC = "save_status"
+
+logger = log.get_logger(__name__)
+
+MAX_ATTEMPTS = 5
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+
+@dataclass(frozen=True)
+class PendingSave:
+    """
+    A change to a single agent which hasn't reached the backend yet.
+    """
+
+    agent_name: str
+
+    # "create", "update" or "delete"
+    action: str
+
+    settings: Dict[str, Any] = field(default_factory=dict)
+    commands: Dict[str, bool] = field(default_factory=dict)
+
+    # How often sending this change has failed so far.
+    attempts: int = 0
+
+    # Whether this change was sent before. Even if that failed, it may have
+    # reached the backend.
+    was_sent: bool = False
+
+
+@dataclass(frozen=True)
+class SaveStatus:
+    # "pending", "saving", "saved" or "failed"
+    state: str
+    action: str
+    error: Optional[str] = None
+    attempts: int = 0
+
+
+def _merge(older: PendingSave, newer: PendingSave) -> Optional[PendingSave]:
+    """
+    Combines two queued changes to the same agent into one. Returns `None` if
+    they cancel each other out.
+    """
+    if newer.action == "delete":
+        # Creating an agent and deleting it again before it was ever sent is a
+        # no-op. A create which failed may still have reached the backend, so
+        # that one has to be followed by the delete.
+        if older.action == "create" and not older.was_sent:
+            return None
+
+        return newer
+
+    if older.action == "delete" or newer.action == "create":
+        return newer
+
+    # Updates are applied on top of whatever is queued, keeping the older
+    # change's action, so a create followed by edits is still a create.
+    return replace(
+        older,
+        settings={**older.settings, **newer.settings},
+        commands={**older.commands, **newer.commands},
+    )
+
+
+def _apply_to_agents(agents: List[Dict[str, Any]], save: PendingSave) -> List[Dict[str, Any]]:
+    name = save.agent_name
+
+    if save.action == "delete":
+        return [agent for agent in agents if agent.get("name") != name]
+
+    if save.action == "create" and all(agent.get("name") != name for agent in agents):
+        return [*agents, {"name": name}]
+
+    return agents
+
+
+def _apply_to_config(config: Dict[str, Any], save: PendingSave) -> Dict[str, Any]:
+    if save.action == "delete":
+        return {}
+
+    return {
+        **config,
+        "settings": {**config.get("settings", {}), **save.settings},
+        "commands": {**config.get("commands", {}), **save.commands},
+    }
+
+
+def _apply_to_cache(save: PendingSave) -> None:
+    agents = api.cache.get("agents", allow_stale=True)
+
+    if agents is not None:
+        api.cache.set("agents", _apply_to_agents(agents, save))
+
+    key = changes.agentconfig_topic(save.agent_name)
+    api.cache.set(key, _apply_to_config(api.cache.get(key, None, allow_stale=True) or {}, save))
+
+
+class SaveQueue:
+    """
+    Sends agent changes to the backend in the background.
+
+    Changes which are queued or being sent are overlaid on everything read
+    through `api`, so the UI reflects them immediately, and polls or reloads
+    of the cache don't hide them. Multiple edits to the same agent which pile
+    up while the backend is busy are merged into a single request. Failed
+    requests are retried with exponential backoff.
+    """
+
+    def __init__(self) -> None:
+        self.statuses: Dict[str, SaveStatus] = {}
+
+        self._pending: Dict[str, PendingSave] = {}
+        self._sending: Dict[str, PendingSave] = {}
+        self._failed: Dict[str, PendingSave] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        api.add_overlay(self.overlay)
+
+    def submit(self, save: PendingSave) -> None:
+        """
+        Queues `save` and returns immediately. Must be called from within the
+        event loop.
+        """
+        name = save.agent_name
+
+        # Resubmitting an agent whose last save failed gives the old change
+        # another chance, together with the new one.
+        previous = self._pending.pop(name, None)
+
+        if previous is None:
+            previous = self._failed.pop(name, None)
+
+        merged = save if previous is None else _merge(previous, save)
+        self._agent_changed_locally(name)
+
+        if merged is None:
+            self.statuses.pop(name, None)
+            changes.notify(STATUS_TOPIC)
+            return
+
+        # A resubmitted change gets the full number of attempts again.
+        merged = replace(merged, attempts=0)
+        self._pending[name] = merged
+        self._set_status(name, SaveStatus(state="pending", action=merged.action))
+
+        worker = self._workers.get(name)
+
+        if worker is None or worker.done():
+            self._workers[name] = asyncio.get_running_loop().create_task(self._drain(name))
+
+    def retry(self, agent_name: str) -> None:
+        """
+        Queues the failed change for `agent_name` again.
+        """
+        save = self._failed.pop(agent_name, None)
+
+        if save is not None:
+            self.submit(save)
+
+    def _set_status(self, agent_name: str, status: SaveStatus) -> None:
+        self.statuses[agent_name] = status
+        changes.notify(STATUS_TOPIC)
+
+    def _agent_changed_locally(self, agent_name: str) -> None:
+        # The overlay changed, but the cache didn't.
+        changes.notify("agents")
+        changes.notify(changes.agentconfig_topic(agent_name))
+
+    def _unsaved(self, agent_name: str) -> List[PendingSave]:
+        # The change being sent is older than the queued one.
+        return [
+            save
+            for save in (self._sending.get(agent_name), self._pending.get(agent_name))
+            if save is not None
+        ]
+
+    def overlay(self, key: str, value: Any) -> Any:
+        """
+        Applies unsaved changes to `value`, which was read from the cache
+        entry `key`. Returns a new value rather than modifying the cached one.
+        """
+        if key == "agents" and isinstance(value, list):
+            for name in {*self._sending, *self._pending}:
+                for save in self._unsaved(name):
+                    value = _apply_to_agents(value, save)
+
+            return value
+
+        if key.startswith(changes.AGENTCONFIG_PREFIX) and isinstance(value, dict):
+            for save in self._unsaved(key[len(changes.AGENTCONFIG_PREFIX):]):
+                value = _apply_to_config(value, save)
+
+        return value
+
+    def _send(self, save: PendingSave) -> None:
+        name = save.agent_name
+
+        if save.action == "create":
+            resilience.call(
+                "add_agent",
+                lambda: ApiClient.add_agent(agent_name=name, settings=save.settings, commands=save.commands),
+            )
+        elif save.action == "update":
+            resilience.call(
+                "update_agent_settings",
+                lambda: ApiClient.update_agent_settings(agent_name=name, settings=save.settings),
+            )
+            resilience.call(
+                "update_agent_commands",
+                lambda: ApiClient.update_agent_commands(agent_name=name, commands=save.commands),
+            )
+        elif save.action == "delete":
+            resilience.call("delete_agent", lambda: ApiClient.delete_agent(name))
+        else:
+            raise ValueError(f"Unknown save action `{save.action}`")
+
+    async def _drain(self, agent_name: str) -> None:
+        while agent_name in self._pending:
+            save = self._sending[agent_name] = self._pending.pop(agent_name)
+            self._set_status(
+                agent_name,
+                SaveStatus(state="saving", action=save.action, attempts=save.attempts),
+            )
+
+            try:
+                await asyncio.to_thread(self._send, save)
+            except Exception as err:
+                save = replace(save, attempts=save.attempts + 1, was_sent=True)
+                del self._sending[agent_name]
+
+                # If the user kept editing in the meantime, the newer edits go
+                # on top of the failed ones. A failed change has been sent at
+                # least once, so this never cancels out.
+                newer = self._pending.pop(agent_name, None)
+                merged = save if newer is None else _merge(save, newer)
+                assert merged is not None
+
+                if save.attempts >= MAX_ATTEMPTS:
+                    logger.error(
+                        "Giving up on saving agent '%s' after %d attempts: %s",
+                        agent_name,
+                        save.attempts,
+                        err,
+                        extra={"event": "save_failed", "agent_name": agent_name},
+                    )
+                    self._failed[agent_name] = merged
+                    self._agent_changed_locally(agent_name)
+                    self._set_status(
+                        agent_name,
+                        SaveStatus(state="failed", action=merged.action, error=str(err), attempts=save.attempts),
+                    )
+                    return
+
+                self._pending[agent_name] = merged
+                self._set_status(
+                    agent_name,
+                    SaveStatus(state="pending", action=merged.action, error=str(err), attempts=save.attempts),
+                )
+
+                backoff = min(INITIAL_BACKOFF * 2 ** (save.attempts - 1), MAX_BACKOFF)
+                await asyncio.sleep(backoff)
+                continue
+
+            # Store what was saved, so reads don't fall back to the old value
+            # until the backend has been asked again. Then mark it stale, so
+            # the next read does just that.
+            _apply_to_cache(save)
+            del self._sending[agent_name]
+            self._set_status(agent_name, SaveStatus(state="saved", action=save.action))
+            changes.agent_changed(agent_name)
+
+
+queue = SaveQueue()
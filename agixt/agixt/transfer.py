@@ -0,0 +1,334 @@
+"""
+Bulk export and import of agent configurations and chains, as JSON Lines.
+
+Each line is one record, either
+
+    {"type": "agent", "name": ..., "settings": {...}, "commands": {...}}
+
+or
+
+    {"type": "chain", "name": ..., "steps": [...]}
+
+Records are streamed one at a time in both directions, so memory use doesn't
+depend on the number of agents or chains. Use it from the command line:
+
+    python -m agixt.transfer export -o backup.jsonl
+    python -m agixt.transfer import -i backup.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import *  # type: ignore
+
+from . import changes
+from . import log
+from . import resilience
+from .api import ApiClient
+
+logger = log.get_logger(__name__)
+
+# How many backend calls run at the same time, by default.
+CONCURRENCY = 8
+
+# How many imported records are applied together, by default.
+BATCH_SIZE = 50
+
+
+@dataclass
+class TransferStats:
+    succeeded: int = 0
+    failed: int = 0
+
+
+def _fetch_agent(name: str) -> Dict[str, Any]:
+    config = resilience.call("get_agentconfig", lambda: ApiClient.get_agentconfig(name))
+
+    return {
+        "type": "agent",
+        "name": name,
+        "settings": config.get("settings", {}),
+        "commands": config.get("commands", {}),
+    }
+
+
+def _fetch_chain(name: str) -> Dict[str, Any]:
+    chain = resilience.call("get_chain", lambda: ApiClient.get_chain(name))
+    steps = chain.get("steps", []) if isinstance(chain, dict) else chain
+
+    return {
+        "type": "chain",
+        "name": name,
+        "steps": steps,
+    }
+
+
+def _bounded_map(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    concurrency: int,
+) -> Iterator[Tuple[Any, Optional[Any], Optional[BaseException]]]:
+    """
+    Calls `fn` for every item, with at most `concurrency` calls in flight, and
+    yields `(item, result, error)` as the calls complete. Items are consumed
+    lazily, so only a bounded number of results is ever held in memory.
+    """
+    items = iter(items)
+    in_flight: Dict[Future, Any] = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            while len(in_flight) < concurrency:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+
+                in_flight[executor.submit(fn, item)] = item
+
+            if not in_flight:
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                item = in_flight.pop(future)
+                error = future.exception()
+                yield item, (None if error is not None else future.result()), error
+
+
+def export_records(
+    output: TextIO,
+    *,
+    agents: bool = True,
+    chains: bool = True,
+    concurrency: int = CONCURRENCY,
+) -> TransferStats:
+    """
+    Writes one JSON line per agent and chain to `output`. Configurations are
+    fetched concurrently and written in the order they arrive.
+    """
+    stats = TransferStats()
+    jobs: List[Tuple[Callable[[str], Dict[str, Any]], Iterable[str]]] = []
+
+    if agents:
+        agent_list = resilience.call("get_agents", ApiClient.get_agents)
+        jobs.append((_fetch_agent, (agent["name"] for agent in agent_list)))
+
+    if chains:
+        chain_names = resilience.call("get_chains", ApiClient.get_chains)
+        jobs.append((_fetch_chain, chain_names))
+
+    for fetch, names in jobs:
+        for name, record, error in _bounded_map(fetch, names, concurrency):
+            if error is not None:
+                stats.failed += 1
+                logger.error(
+                    "Couldn't export %s: %s",
+                    name,
+                    error,
+                    extra={"event": "export_failed", "record_name": name},
+                )
+                continue
+
+            output.write(json.dumps(record) + "\n")
+            stats.succeeded += 1
+
+    return stats
+
+
+def _read_records(source: TextIO, stats: TransferStats) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the records in `source`. Lines which aren't records are logged and
+    counted as failed, rather than ending the import halfway through.
+    """
+    for line_number, line in enumerate(source, start=1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as err:
+            problem = f"not valid JSON: {err}"
+        else:
+            if (
+                isinstance(record, dict)
+                and isinstance(record.get("type"), str)
+                and isinstance(record.get("name"), str)
+            ):
+                yield record
+                continue
+
+            problem = "not a record with a type and a name"
+
+        stats.failed += 1
+        logger.error(
+            "Couldn't import line %d: %s",
+            line_number,
+            problem,
+            extra={"event": "import_failed", "line_number": line_number},
+        )
+
+
+def _batches(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+
+    for record in records:
+        batch.append(record)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def import_records(
+    source: TextIO,
+    *,
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+) -> TransferStats:
+    """
+    Reads records written by `export_records` and creates or updates the
+    corresponding agents and chains. The input is parsed incrementally and
+    applied one batch at a time.
+    """
+    stats = TransferStats()
+    existing_agents = {
+        agent["name"] for agent in resilience.call("get_agents", ApiClient.get_agents)
+    }
+
+    def apply(record: Dict[str, Any]) -> None:
+        name = record["name"]
+
+        if record["type"] == "agent":
+            if name in existing_agents:
+                resilience.call(
+                    "update_agent_settings",
+                    lambda: ApiClient.update_agent_settings(agent_name=name, settings=record["settings"]),
+                )
+                resilience.call(
+                    "update_agent_commands",
+                    lambda: ApiClient.update_agent_commands(agent_name=name, commands=record["commands"]),
+                )
+            else:
+                resilience.call(
+                    "add_agent",
+                    lambda: ApiClient.add_agent(agent_name=name, settings=record["settings"], commands=record["commands"]),
+                )
+                existing_agents.add(name)
+        elif record["type"] == "chain":
+            resilience.call(
+                "import_chain",
+                lambda: ApiClient.import_chain(chain_name=name, steps=record["steps"]),
+            )
+        else:
+            raise ValueError(f"Unknown record type `{record['type']}`")
+
+    def apply_in_order(records: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Optional[Exception]]]:
+        results: List[Tuple[Dict[str, Any], Optional[Exception]]] = []
+
+        for record in records:
+            try:
+                apply(record)
+            except Exception as err:
+                results.append((record, err))
+            else:
+                results.append((record, None))
+
+        return results
+
+    try:
+        for batch in _batches(_read_records(source, stats), batch_size):
+            # Records for the same agent or chain are applied one after the
+            # other, so duplicates don't race each other, e.g. by both
+            # creating an agent.
+            groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+            for record in batch:
+                groups.setdefault((record["type"], record["name"]), []).append(record)
+
+            for _, results, _ in _bounded_map(apply_in_order, groups.values(), concurrency):
+                for record, error in results:
+                    if error is not None:
+                        stats.failed += 1
+                        logger.error(
+                            "Couldn't import %s: %s",
+                            record["name"],
+                            error,
+                            extra={"event": "import_failed", "record_name": record["name"]},
+                        )
+                    else:
+                        stats.succeeded += 1
+    finally:
+        # Let open sessions know that the catalogs have changed, even if the
+        # import was cut short after applying some of the records.
+        changes.publish("agents")
+        changes.publish("chains")
+
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m agixt.transfer",
+        description="Export or import AGiXT agents and chains as JSON Lines.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write agents and chains to a file.")
+    export_parser.add_argument("-o", "--output", default="-", help="File to write to. Defaults to stdout.")
+    export_parser.add_argument("--no-agents", action="store_true", help="Skip agents.")
+    export_parser.add_argument("--no-chains", action="store_true", help="Skip chains.")
+    export_parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+
+    import_parser = subparsers.add_parser("import", help="Create or update agents and chains from a file.")
+    import_parser.add_argument("-i", "--input", default="-", help="File to read from. Defaults to stdin.")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    import_parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        output_file = (
+            contextlib.nullcontext(sys.stdout)
+            if args.output == "-"
+            else open(args.output, "w", encoding="utf-8")
+        )
+
+        with output_file as output:
+            stats = export_records(
+                output,
+                agents=not args.no_agents,
+                chains=not args.no_chains,
+                concurrency=args.concurrency,
+            )
+    else:
+        source_file = (
+            contextlib.nullcontext(sys.stdin)
+            if args.input == "-"
+            else open(args.input, encoding="utf-8")
+        )
+
+        with source_file as source:
+            stats = import_records(
+                source,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+            )
+
+    print(f"{stats.succeeded} records {args.command}ed, {stats.failed} failed", file=sys.stderr)
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agixt import admission
+
+
+def session(client_ip="10.0.0.1", forwarded=None):
+    headers = {} if forwarded is None else {"x-forwarded-for": forwarded}
+    return SimpleNamespace(client_ip=client_ip, http_headers=headers)
+
+
+def test_direct_connections_are_keyed_on_the_client_address(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", 0)
+
+    assert admission._user_of(session()) == "10.0.0.1"
+
+
+def test_forwarded_requests_without_trusted_proxies_have_no_user(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", 0)
+
+    assert admission._user_of(session(forwarded="203.0.113.7")) is None
+
+
+def test_user_is_the_address_added_by_the_outermost_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", 1)
+
+    assert admission._user_of(session(forwarded="198.51.100.1, 203.0.113.7")) == "203.0.113.7"
+    assert admission._user_of(session()) is None
+
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", 2)
+
+    assert admission._user_of(session(forwarded="198.51.100.1, 203.0.113.7, 10.0.0.2")) == "203.0.113.7"
+    assert admission._user_of(session(forwarded="203.0.113.7")) is None
+
+
+def test_tokens_are_refunded_when_no_slot_is_free(monkeypatch):
+    limiter = admission.Limiter(admission.Budget(rate=1, burst=1, concurrency=1))
+    monkeypatch.setattr(admission, "_limiters_for", lambda current: [limiter])
+
+    assert limiter.slots.acquire(blocking=False)
+
+    with pytest.raises(admission.AdmissionError):
+        with admission.admit(timeout=0):
+            pass
+
+    limiter.slots.release()
+
+    with admission.admit(timeout=0):
+        pass
@@ -0,0 +1,47 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agixt import assets
+
+LOGO = "AGiXT-gradient-light.svg"
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    assets.mount(app)
+    return TestClient(app)
+
+
+def test_serves_raw_asset_without_accept_encoding(client):
+    asset = assets.manifest[LOGO]
+    response = client.get(asset.url, headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    assert response.headers["cache-control"] == assets.IMMUTABLE_CACHE_CONTROL
+    assert response.content == asset.raw
+
+
+def test_serves_gzip_when_accepted(client):
+    asset = assets.manifest[LOGO]
+    response = client.get(asset.url, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == asset.raw
+
+
+def test_revalidation_and_unknown_assets(client):
+    asset = assets.manifest[LOGO]
+
+    assert client.get(asset.url, headers={"If-None-Match": asset.etag}).status_code == 304
+    assert client.get(f"{assets.URL_PREFIX}/missing.0123456789ab.svg").status_code == 404
+
+
+def test_critical_assets_are_inlined_whatever_their_size():
+    assert len(assets.manifest[LOGO].raw) > assets.INLINE_LIMIT
+    assert assets.url(LOGO).startswith("data:image/svg+xml;base64,")
@@ -0,0 +1,161 @@
+import pytest
+
+from agixt import admission
+from agixt import api
+from agixt import fleet
+from agixt.cache import Cache
+from agixt.fleet import FleetTable
+
+
+@pytest.fixture
+def table():
+    table = FleetTable()
+    table.upsert("a", {"provider": "openai", "temperature": 0.7})
+    table.upsert("b", {"provider": "openai", "temperature": 1})
+    table.upsert("c", {"provider": "ollama", "temperature": "1"})
+    return table
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(api, "cache", Cache())
+    monkeypatch.setattr(api, "_overlays", [])
+
+    agents = {
+        "a": {"provider": "openai"},
+        "b": {"provider": "ollama"},
+    }
+
+    monkeypatch.setattr(api.ApiClient, "get_agents", lambda: [{"name": name} for name in agents])
+    monkeypatch.setattr(api.ApiClient, "get_agentconfig", lambda name: {"settings": dict(agents[name])})
+    return agents
+
+
+def test_where_and_group_by(table):
+    assert sorted(table.names(table.where("provider", "openai"))) == ["a", "b"]
+    assert table.group_by("provider") == {'"openai"': 2, '"ollama"': 1}
+
+
+def test_values_keep_their_type(table):
+    assert table.names(table.where("temperature", 1)) == ["b"]
+    assert table.names(table.where("temperature", "1")) == ["c"]
+    assert table.group_by("temperature") == {"0.7": 1, "1": 1, '"1"': 1}
+
+
+def test_diff_against_reference(table):
+    differences = table.diff(table.settings_of("b"))
+
+    assert sorted(differences) == ["provider", "temperature"]
+    assert table.names(differences["provider"]) == ["c"]
+    assert sorted(table.names(differences["temperature"])) == ["a", "c"]
+
+
+def test_new_columns_are_missing_for_existing_agents(table):
+    table.upsert("d", {"provider": "openai", "vision_provider": "none"})
+
+    assert sorted(table.names(table.where("vision_provider", None))) == ["a", "b", "c"]
+    assert table.settings_of("a")["vision_provider"] is None
+
+
+def test_upsert_replaces_values(table):
+    table.upsert("a", {"provider": "ollama"})
+
+    assert table.group_by("provider") == {'"openai"': 1, '"ollama"': 2}
+    assert table.names(table.where("temperature", None)) == ["a"]
+
+
+def test_removed_rows_are_reused(table):
+    table.remove("b")
+
+    assert len(table) == 2
+    assert table.group_by("provider") == {'"openai"': 1, '"ollama"': 1}
+
+    table.upsert("e", {"provider": "openai"})
+
+    assert len(table) == 3
+    assert sorted(table.names(table.where("provider", "openai"))) == ["a", "e"]
+
+
+def test_sync_adds_and_drops_agents(backend):
+    table = FleetTable()
+    table.upsert("gone", {"provider": "openai"})
+    table.sync()
+
+    assert sorted(table.names(table.all)) == ["a", "b"]
+
+
+def test_reload_bypasses_the_cache(backend):
+    table = FleetTable()
+    table.sync()
+
+    backend["a"]["provider"] = "ollama"
+    table.sync()
+    assert table.settings_of("a")["provider"] == "openai"
+
+    table.sync(reload=True)
+    assert table.settings_of("a")["provider"] == "ollama"
+
+
+def test_refresh_keeps_agents_which_cant_be_fetched(backend, monkeypatch):
+    table = FleetTable()
+    table.sync()
+    api.cache.invalidate_prefix("agentconfig:")
+
+    def fail(name):
+        raise Exception("Unable to retrieve data.")
+
+    monkeypatch.setattr(api.ApiClient, "get_agentconfig", fail)
+    table.refresh_agent("a")
+
+    assert table.settings_of("a")["provider"] == "openai"
+
+
+def test_refresh_removes_deleted_agents(backend):
+    table = FleetTable()
+    table.sync()
+
+    del backend["a"]
+    api.cache.invalidate("agents")
+    table.refresh_agent("a")
+
+    assert table.names(table.all) == ["b"]
+
+
+def test_sync_fetches_within_the_callers_budget(backend, monkeypatch):
+    clients = []
+    limiters_for = admission._limiters_for
+
+    def record_client(current):
+        clients.append(current)
+        return limiters_for(current)
+
+    monkeypatch.setattr(admission, "_limiters_for", record_client)
+
+    class Session:
+        client_ip = "127.0.0.1"
+
+    with admission.client(Session()):
+        FleetTable().sync()
+
+    # One call for the agent list, and one per agent.
+    assert len(clients) == 3
+    assert all(client is not None for client in clients)
+
+
+def test_sync_reports_progress_and_runs_once_at_a_time(backend, monkeypatch):
+    table = FleetTable()
+    notified = []
+    monkeypatch.setattr(fleet.changes, "notify", notified.append)
+
+    def get_agentconfig(name):
+        # A load started while this one is running is skipped.
+        table.sync()
+        return {"settings": dict(backend[name])}
+
+    monkeypatch.setattr(api.ApiClient, "get_agentconfig", get_agentconfig)
+    table.sync()
+
+    assert not table.is_loading
+    assert (table.loaded, table.to_load) == (2, 2)
+    assert sorted(table.names(table.all)) == ["a", "b"]
+    assert notified[0] == notified[-1] == fleet.TOPIC
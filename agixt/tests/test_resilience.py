@@ -0,0 +1,91 @@
+import time
+
+import pytest
+import requests
+
+from agixt import resilience
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = resilience.CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    monkeypatch.setattr(resilience, "breaker", breaker)
+    return breaker
+
+
+def sdk_failure(error: BaseException):
+    # Mimics `AGiXTSDK.handle_error`, which wraps every error in a plain
+    # `Exception`.
+    def fn():
+        try:
+            raise error
+        except Exception as e:
+            raise Exception(f"Unable to retrieve data. {e}")
+
+    return fn
+
+
+def test_wrapped_connection_errors_open_the_circuit(breaker):
+    fn = sdk_failure(requests.ConnectionError("Connection refused"))
+
+    for _ in range(3):
+        with pytest.raises(Exception, match="Unable to retrieve data"):
+            resilience.call("get_agents", fn)
+
+    assert breaker.is_open
+
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.call("get_agents", lambda: [])
+
+
+def test_other_errors_dont_reset_the_failure_count(breaker):
+    refused = sdk_failure(requests.ConnectionError("Connection refused"))
+    missing = sdk_failure(KeyError("agents"))
+
+    for fn in (refused, refused, missing, refused):
+        with pytest.raises(Exception):
+            resilience.call("get_agents", fn)
+
+    assert breaker.is_open
+
+
+def test_other_errors_dont_open_the_circuit(breaker):
+    for _ in range(5):
+        with pytest.raises(Exception):
+            resilience.call("get_agents", sdk_failure(KeyError("agents")))
+
+    assert not breaker.is_open
+
+
+def test_success_closes_the_circuit(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow()
+
+    breaker._opened_at = time.monotonic() - breaker.reset_timeout
+    assert resilience.call("get_agents", lambda: ["agent"]) == ["agent"]
+    assert not breaker.is_open
+
+
+def test_inconclusive_trial_allows_another_trial(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+
+    breaker._opened_at = time.monotonic() - breaker.reset_timeout
+
+    with pytest.raises(Exception):
+        resilience.call("get_agents", sdk_failure(KeyError("agents")))
+
+    assert breaker.is_open
+    assert breaker.allow()
+
+
+def test_timeouts_count_as_failures(breaker, monkeypatch):
+    monkeypatch.setitem(resilience.POLICIES, "slow", resilience.EndpointPolicy(timeout=0.01))
+
+    with pytest.raises(TimeoutError):
+        resilience.call("slow", lambda: time.sleep(0.2))
+
+    assert breaker._failures == 1
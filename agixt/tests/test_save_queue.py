@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from agixt import api
+from agixt import save_queue
+from agixt.cache import Cache
+from agixt.save_queue import PendingSave, SaveQueue, _merge
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(api, "cache", Cache())
+    monkeypatch.setattr(api, "_overlays", [])
+    monkeypatch.setattr(save_queue, "INITIAL_BACKOFF", 0)
+
+    queue = SaveQueue()
+    queue.sent = []
+
+    def send(save):
+        queue.sent.append(save)
+
+        if getattr(queue, "fail", False):
+            raise OSError("Connection refused")
+
+    queue._send = send
+    return queue
+
+
+def read_agents():
+    return api._read("agents", "get_agents", lambda: pytest.fail("Not cached"))
+
+
+def read_config(name):
+    return api._read(f"agentconfig:{name}", "get_agentconfig", lambda: pytest.fail("Not cached"))
+
+
+async def settle(queue):
+    for worker in list(queue._workers.values()):
+        await worker
+
+
+def test_merge_combines_updates():
+    older = PendingSave("a", "update", settings={"x": "1", "y": "1"})
+    newer = PendingSave("a", "update", settings={"y": "2"})
+
+    assert _merge(older, newer).settings == {"x": "1", "y": "2"}
+
+
+def test_merge_keeps_create_action():
+    older = PendingSave("a", "create", settings={"x": "1"})
+    newer = PendingSave("a", "update", settings={"x": "2"})
+
+    merged = _merge(older, newer)
+    assert merged.action == "create"
+    assert merged.settings == {"x": "2"}
+
+
+def test_merge_cancels_unsent_create_and_delete():
+    assert _merge(PendingSave("a", "create"), PendingSave("a", "delete")) is None
+
+
+def test_merge_keeps_delete_after_failed_create():
+    older = PendingSave("a", "create", attempts=1, was_sent=True)
+
+    assert _merge(older, PendingSave("a", "delete")).action == "delete"
+
+
+def test_pending_changes_survive_cache_refreshes(queue):
+    api.cache.set("agents", [{"name": "a"}])
+    api.cache.set("agentconfig:a", {"settings": {"provider": "old"}, "commands": {}})
+
+    async def run():
+        queue.submit(PendingSave("a", "update", settings={"provider": "new"}))
+        queue.submit(PendingSave("b", "create"))
+
+        # The change watcher storing what the backend still says.
+        api.cache.set("agents", [{"name": "a"}])
+        api.cache.set("agentconfig:a", {"settings": {"provider": "old"}, "commands": {}})
+
+        assert read_config("a")["settings"]["provider"] == "new"
+        assert [agent["name"] for agent in read_agents()] == ["a", "b"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_create_leaves_no_agent_behind(queue):
+    api.cache.set("agents", [{"name": "a"}])
+
+    async def run():
+        queue.submit(PendingSave("new", "create"))
+        assert [agent["name"] for agent in read_agents()] == ["a", "new"]
+
+        queue.submit(PendingSave("new", "delete"))
+        assert [agent["name"] for agent in read_agents()] == ["a"]
+
+        await settle(queue)
+
+    asyncio.run(run())
+
+    assert queue.sent == []
+    assert "new" not in queue.statuses
+
+
+def test_saved_changes_are_cached(queue):
+    api.cache.set("agents", [{"name": "a"}])
+    api.cache.set("agentconfig:a", {"settings": {"provider": "old"}, "commands": {}})
+
+    async def run():
+        queue.submit(PendingSave("a", "update", settings={"provider": "new"}))
+        await settle(queue)
+
+    asyncio.run(run())
+
+    assert [save.action for save in queue.sent] == ["update"]
+    assert queue.statuses["a"].state == "saved"
+    assert api.cache.get("agentconfig:a", allow_stale=True)["settings"]["provider"] == "new"
+
+
+def test_failed_changes_are_no_longer_shown(queue, monkeypatch):
+    monkeypatch.setattr(save_queue, "MAX_ATTEMPTS", 2)
+    api.cache.set("agents", [{"name": "a"}])
+    queue.fail = True
+
+    async def run():
+        queue.submit(PendingSave("b", "create"))
+        await settle(queue)
+
+    asyncio.run(run())
+
+    assert len(queue.sent) == 2
+    assert queue.statuses["b"].state == "failed"
+    assert [agent["name"] for agent in read_agents()] == ["a"]
+
+
+def test_failed_create_is_deleted_rather_than_cancelled(queue, monkeypatch):
+    monkeypatch.setattr(save_queue, "MAX_ATTEMPTS", 1)
+    queue.fail = True
+
+    async def run():
+        queue.submit(PendingSave("b", "create"))
+        await settle(queue)
+
+        queue.fail = False
+        queue.submit(PendingSave("b", "delete"))
+        await settle(queue)
+
+    asyncio.run(run())
+
+    assert [save.action for save in queue.sent] == ["create", "delete"]
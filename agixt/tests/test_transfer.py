@@ -0,0 +1,37 @@
+import io
+
+from agixt import changes
+from agixt import transfer
+from agixt.api import ApiClient
+
+
+def test_malformed_lines_are_counted_as_failed(monkeypatch):
+    added = []
+    published = []
+
+    monkeypatch.setattr(ApiClient, "get_agents", lambda: [])
+    monkeypatch.setattr(ApiClient, "add_agent", lambda agent_name, settings, commands: added.append(agent_name))
+    monkeypatch.setattr(changes, "publish", published.append)
+
+    source = io.StringIO(
+        '{"type": "agent", "name": "a", "settings": {}, "commands": {}}\n'
+        "[1]\n"
+        "{not json\n"
+        '{"type": "agent", "name": ["b"]}\n'
+        '{"type": "agent", "name": "c", "settings": {}, "commands": {}}\n'
+    )
+    stats = transfer.import_records(source, batch_size=2)
+
+    assert (stats.succeeded, stats.failed) == (2, 3)
+    assert sorted(added) == ["a", "c"]
+    assert published == ["agents", "chains"]
+
+
+def test_main_exits_with_an_error_if_records_failed(monkeypatch, tmp_path):
+    monkeypatch.setattr(ApiClient, "get_agents", lambda: [])
+    monkeypatch.setattr(changes, "publish", lambda topic: None)
+
+    path = tmp_path / "backup.jsonl"
+    path.write_text("[1]\n", encoding="utf-8")
+
+    assert transfer.main(["import", "-i", str(path)]) == 1